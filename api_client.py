@@ -1,15 +1,44 @@
 """
 Клиент для работы с OpenRouter API
 """
-import base64
+import asyncio
 import json
 import logging
+import re
+from functools import partial
 from io import BytesIO
 from typing import Optional, Dict, Any
 
 import aiohttp
+import orjson
 from PIL import Image
 
+try:
+    # SIMD-ускоренный base64 (AVX2/NEON), API совместим со stdlib
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+try:
+    # libjpeg-turbo с SIMD DCT/Хаффманом для пересжатия JPEG
+    from turbojpeg import TurboJPEG, TJSAMP_422
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _turbo_jpeg = None
+
+try:
+    # Lossless-оптимизация JPEG (mozjpeg): пересчёт таблиц Хаффмана без декодирования
+    import mozjpeg_lossless_optimization
+except ImportError:
+    mozjpeg_lossless_optimization = None
+
+try:
+    # SIMD-парсер JSON для ответов модели
+    import simdjson
+    _simdjson_parser = simdjson.Parser()
+except ImportError:
+    _simdjson_parser = None
+
 from config import (
     OPENROUTER_API_KEY,
     OPENROUTER_API_URL,
@@ -21,6 +50,91 @@ from validator import FoodAnalysisValidator
 
 logger = logging.getLogger(__name__)
 
+# Заглушка для data URI в JSON-теле запроса: base64 изображения
+# подставляется в уже сериализованные байты, минуя str.
+# Chat completions OpenRouter принимает только JSON (data URI или URL
+# изображения), multipart/form-data не поддерживается. Публичного хранилища
+# для передачи URL у бота нет, а ссылки на файлы Telegram содержат токен бота,
+# поэтому изображение передаётся как data URI.
+_IMAGE_URL_PLACEHOLDER = "__IMAGE_DATA_URI__"
+_IMAGE_URL_PLACEHOLDER_BYTES = _IMAGE_URL_PLACEHOLDER.encode('ascii')
+_IMAGE_DATA_URI_PREFIX = b"data:image/jpeg;base64,"
+
+_JPEG_MAGIC = b'\xff\xd8'
+
+# Очистка невалидного JSON от модели: комментарии и trailing commas
+_COMMENT_LINE_RE = re.compile(r'//.*?\n')
+_COMMENT_BLOCK_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+
+# Обязательные поля ответа модели и значения по умолчанию (для остальных — 0)
+_REQUIRED_FIELDS = (
+    'dish_name', 'weight_grams', 'calories_per_100g',
+    'calories_total', 'protein_g', 'fat_g', 'carbs_g',
+    'health_score', 'detailed_analysis', 'recommendations',
+    'portion_advice'
+)
+_FIELD_DEFAULTS = {
+    'detailed_analysis': "Информация недоступна",
+    'recommendations': "Информация недоступна",
+    'portion_advice': "Информация недоступна"
+}
+
+# Структурные токены JSON: escape-последовательность, фигурные скобки, кавычка
+_JSON_TOKEN_RE = re.compile(r'\\.|[{}"]', re.DOTALL)
+
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """
+    Извлекает первый JSON-объект из текста за один проход
+    
+    Отслеживает глубину скобок с учётом строк и escape-последовательностей,
+    поэтому текст модели после JSON не попадает в результат.
+    
+    Args:
+        text: Текст ответа модели
+        
+    Returns:
+        Подстрока с JSON-объектом или None, если объект не найден
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    for match in _JSON_TOKEN_RE.finditer(text, start):
+        token = match.group()
+        if token == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:match.end()]
+    
+    # Скобки не сбалансированы (например, из-за комментариев) —
+    # берём всё до последней закрывающей скобки
+    end = text.rfind('}')
+    return text[start:end + 1] if end > start else None
+
+
+def _loads_json_object(json_str: str) -> Dict[str, Any]:
+    """
+    Парсит JSON-объект из ответа модели
+    
+    Использует simdjson, если он установлен, иначе стандартный json.
+    
+    Raises:
+        ValueError: Если строка не является корректным JSON
+    """
+    if _simdjson_parser is None:
+        return json.loads(json_str)
+    return _simdjson_parser.parse(json_str.encode()).as_dict()
+
 
 class OpenRouterClient:
     """Клиент для взаимодействия с OpenRouter API"""
@@ -36,11 +150,47 @@ class OpenRouterClient:
             "X-Title": "Food Analyzer Bot"
         }
         self.validator = FoodAnalysisValidator()
+        
+        # Общая HTTP-сессия: keep-alive переиспользует TCP/TLS соединения
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую HTTP-сессию, создавая её при первом обращении
+        
+        Returns:
+            Сессия aiohttp с пулом соединений
+        """
+        if self._session is not None and not self._session.closed:
+            return self._session
+        
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=100,
+                        limit_per_host=20,
+                        keepalive_timeout=60,
+                        ttl_dns_cache=300
+                    ),
+                    timeout=aiohttp.ClientTimeout(total=60)
+                )
+        return self._session
+    
+    async def close(self):
+        """Закрывает общую HTTP-сессию"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def compress_image_if_needed(self, image_bytes: bytes) -> bytes:
         """
         Сжимает изображение, если оно превышает максимальный размер
         
+        Декодирование и кодирование JPEG выполняются в пуле потоков,
+        чтобы не блокировать event loop.
+        
         Args:
             image_bytes: Байты изображения
             
@@ -54,44 +204,89 @@ class OpenRouterClient:
         
         logger.info(f"Сжатие изображения: {size_mb:.2f} MB -> целевой размер: {MAX_PHOTO_SIZE_MB} MB")
         
-        # Открываем изображение
+        return await asyncio.to_thread(self._compress_sync, image_bytes)
+    
+    def _open_rgb(self, image_bytes: bytes) -> Image.Image:
+        """Открывает изображение через PIL и приводит к RGB"""
         image = Image.open(BytesIO(image_bytes))
         
         # Конвертируем в RGB если необходимо
         if image.mode in ('RGBA', 'LA', 'P'):
             image = image.convert('RGB')
         
-        # Уменьшаем качество постепенно
-        quality = 85
-        while quality > 20:
-            output = BytesIO()
-            image.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_bytes = output.getvalue()
+        return image
+    
+    def _encode_jpeg(self, image: Image.Image, quality: int) -> bytes:
+        """Кодирует изображение в JPEG с заданным качеством"""
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=quality, subsampling=2, progressive=False)
+        return output.getvalue()
+    
+    def _compress_sync(self, image_bytes: bytes) -> bytes:
+        """
+        Синхронное сжатие изображения (выполняется вне event loop)
+        
+        Вместо перебора качества делает одно пробное кодирование с quality=85
+        и по соотношению размеров сразу оценивает целевое качество.
+        
+        Args:
+            image_bytes: Байты изображения
             
-            new_size_mb = len(compressed_bytes) / (1024 * 1024)
+        Returns:
+            Сжатые байты изображения
+        """
+        is_jpeg = image_bytes[:2] == _JPEG_MAGIC
+        
+        if is_jpeg and mozjpeg_lossless_optimization is not None:
+            # Часто lossless-оптимизации достаточно, чтобы уложиться в лимит
+            image_bytes = mozjpeg_lossless_optimization.optimize(image_bytes)
+            new_size_mb = len(image_bytes) / (1024 * 1024)
             if new_size_mb <= MAX_PHOTO_SIZE_MB:
-                logger.info(f"Изображение сжато до {new_size_mb:.2f} MB с качеством {quality}")
-                return compressed_bytes
-            
-            quality -= 10
+                logger.info(f"Изображение оптимизировано без потерь до {new_size_mb:.2f} MB")
+                return image_bytes
+        
+        image = None
+        if _turbo_jpeg is not None and is_jpeg:
+            # JPEG пересжимаем через libjpeg-turbo, минуя PIL
+            pixels = _turbo_jpeg.decode(image_bytes)
+            encode = partial(_turbo_jpeg.encode, pixels, jpeg_subsample=TJSAMP_422)
+        else:
+            image = self._open_rgb(image_bytes)
+            encode = partial(self._encode_jpeg, image)
+        
+        # Пробное кодирование с исходным качеством
+        quality = 85
+        compressed_bytes = encode(quality=quality)
+        new_size_mb = len(compressed_bytes) / (1024 * 1024)
+        
+        ratio = new_size_mb / MAX_PHOTO_SIZE_MB
+        if ratio > 1:
+            # Оцениваем качество, при котором файл уложится в лимит
+            quality = max(25, min(85, int(85 / (ratio ** 0.9))))
+            compressed_bytes = encode(quality=quality)
+            new_size_mb = len(compressed_bytes) / (1024 * 1024)
+        
+        if new_size_mb <= MAX_PHOTO_SIZE_MB:
+            logger.info(f"Изображение сжато до {new_size_mb:.2f} MB с качеством {quality}")
+            return compressed_bytes
+        
+        # Если все еще слишком большое, уменьшаем разрешение (через PIL)
+        if image is None:
+            image = self._open_rgb(image_bytes)
         
-        # Если все еще слишком большое, уменьшаем разрешение
         max_dimension = 1920
         if max(image.size) > max_dimension:
             ratio = max_dimension / max(image.size)
             new_size = tuple(int(dim * ratio) for dim in image.size)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
-            
-            output = BytesIO()
-            image.save(output, format='JPEG', quality=85, optimize=True)
-            compressed_bytes = output.getvalue()
+            image = image.resize(new_size, Image.Resampling.BICUBIC, reducing_gap=3.0)
+            compressed_bytes = self._encode_jpeg(image, 85)
             
             logger.info(f"Изображение уменьшено до {new_size} и сжато до {len(compressed_bytes) / (1024 * 1024):.2f} MB")
             return compressed_bytes
         
         return image_bytes
     
-    def image_to_base64(self, image_bytes: bytes) -> str:
+    def image_to_base64_bytes(self, image_bytes: bytes) -> bytes:
         """
         Конвертирует изображение в base64
         
@@ -99,9 +294,26 @@ class OpenRouterClient:
             image_bytes: Байты изображения
             
         Returns:
-            Base64 строка
+            Base64 в виде ASCII-байтов (без декодирования в str)
         """
-        return base64.b64encode(image_bytes).decode('utf-8')
+        return base64.b64encode(image_bytes)
+    
+    def build_request_body(self, payload: Dict[str, Any], base64_image: bytes) -> bytes:
+        """
+        Сериализует payload в JSON и вставляет base64 изображения
+        
+        Изображение записывается в тело запроса один раз, без промежуточной
+        строки data URI и повторного кодирования всего словаря.
+        
+        Args:
+            payload: Тело запроса с заглушкой вместо URL изображения
+            base64_image: Base64 байты изображения
+            
+        Returns:
+            Готовое JSON-тело запроса
+        """
+        prefix, suffix = orjson.dumps(payload).split(_IMAGE_URL_PLACEHOLDER_BYTES, 1)
+        return b"".join((prefix, _IMAGE_DATA_URI_PREFIX, base64_image, suffix))
     
     async def analyze_food_image(self, image_bytes: bytes) -> Optional[Dict[str, Any]]:
         """
@@ -118,7 +330,7 @@ class OpenRouterClient:
             image_bytes = await self.compress_image_if_needed(image_bytes)
             
             # Конвертируем в base64
-            base64_image = self.image_to_base64(image_bytes)
+            base64_image = self.image_to_base64_bytes(image_bytes)
             
             # Детальный промпт для пользователя
             user_prompt = """ПРОАНАЛИЗИРУЙ ЭТУ ФОТОГРАФИЮ ЕДЫ МАКСИМАЛЬНО ТОЧНО:
@@ -150,7 +362,7 @@ class OpenRouterClient:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
+                                    "url": _IMAGE_URL_PLACEHOLDER
                                 }
                             }
                         ]
@@ -159,92 +371,74 @@ class OpenRouterClient:
                 "temperature": 0.1,  # Минимальная креативность для точности
                 "max_tokens": 2000
             }
+            body = self.build_request_body(payload, base64_image)
             
             # Отправляем запрос
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"OpenRouter API error: {response.status} - {error_text}")
-                        return None
-                    
-                    result = await response.json()
-                    
-                    # Извлекаем текст ответа
-                    if 'choices' not in result or len(result['choices']) == 0:
-                        logger.error("Нет ответа от API")
-                        return None
-                    
-                    content = result['choices'][0]['message']['content']
-                    logger.info(f"Получен ответ от API: {content[:200]}...")
-                    
-                    # Парсим JSON из ответа
-                    # Убираем markdown блоки если есть
-                    content = content.replace('```json', '').replace('```', '')
+            session = await self._get_session()
+            async with session.post(
+                self.api_url,
+                headers=self.headers,
+                data=body
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"OpenRouter API error: {response.status} - {error_text}")
+                    return None
+                
+                result = await response.json()
+                
+                # Извлекаем текст ответа
+                if 'choices' not in result or len(result['choices']) == 0:
+                    logger.error("Нет ответа от API")
+                    return None
+                
+                content = result['choices'][0]['message']['content']
+                logger.info(f"Получен ответ от API: {content[:200]}...")
+                
+                # Парсим JSON из ответа
+                # Убираем markdown блоки если есть
+                content = content.replace('```json', '').replace('```', '')
+                
+                # Ищем JSON в ответе
+                json_str = _extract_json_object(content)
+                
+                if json_str is None:
+                    logger.error("JSON не найден в ответе")
+                    return None
+                
+                # Пытаемся распарсить JSON
+                try:
+                    parsed_data = _loads_json_object(json_str)
+                except ValueError as e:
+                    logger.error(f"Ошибка парсинга JSON: {e}")
+                    logger.error(f"Проблемный JSON: {json_str[:500]}...")
                     
-                    # Ищем JSON в ответе
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
+                    # Пытаемся очистить JSON от комментариев и лишних символов
+                    # Удаляем комментарии
+                    json_str = _COMMENT_LINE_RE.sub('\n', json_str)
+                    json_str = _COMMENT_BLOCK_RE.sub('', json_str)
+                    # Удаляем trailing commas
+                    json_str = _TRAILING_COMMA_RE.sub(r'\1', json_str)
                     
-                    if json_start == -1 or json_end == 0:
-                        logger.error("JSON не найден в ответе")
-                        return None
-                    
-                    json_str = content[json_start:json_end]
-                    
-                    # Пытаемся распарсить JSON
                     try:
-                        parsed_data = json.loads(json_str)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Ошибка парсинга JSON: {e}")
-                        logger.error(f"Проблемный JSON: {json_str[:500]}...")
-                        
-                        # Пытаемся очистить JSON от комментариев и лишних символов
-                        import re
-                        # Удаляем комментарии
-                        json_str = re.sub(r'//.*?\n', '\n', json_str)
-                        json_str = re.sub(r'/\*.*?\*/', '', json_str, flags=re.DOTALL)
-                        # Удаляем trailing commas
-                        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
-                        
-                        try:
-                            parsed_data = json.loads(json_str)
-                            logger.info("JSON успешно распарсен после очистки")
-                        except json.JSONDecodeError as e2:
-                            logger.error(f"Не удалось распарсить JSON даже после очистки: {e2}")
-                            return None
-                    
-                    # Валидация обязательных полей
-                    required_fields = [
-                        'dish_name', 'weight_grams', 'calories_per_100g',
-                        'calories_total', 'protein_g', 'fat_g', 'carbs_g',
-                        'health_score', 'detailed_analysis', 'recommendations',
-                        'portion_advice'
-                    ]
-                    
-                    for field in required_fields:
-                        if field not in parsed_data:
-                            logger.warning(f"Отсутствует обязательное поле: {field}, добавляем значение по умолчанию")
-                            # Добавляем значения по умолчанию для отсутствующих полей
-                            if field == 'warnings':
-                                parsed_data[field] = []
-                            elif field == 'components':
-                                parsed_data[field] = []
-                            elif field in ['detailed_analysis', 'recommendations', 'portion_advice']:
-                                parsed_data[field] = "Информация недоступна"
-                            else:
-                                parsed_data[field] = 0
-                    
-                    # Валидируем результат
-                    validated_data = self.validator.validate(parsed_data)
-                    
-                    return validated_data
-                    
+                        parsed_data = _loads_json_object(json_str)
+                        logger.info("JSON успешно распарсен после очистки")
+                    except ValueError as e2:
+                        logger.error(f"Не удалось распарсить JSON даже после очистки: {e2}")
+                        return None
+                
+                # Валидация обязательных полей
+                for field in _REQUIRED_FIELDS:
+                    if field not in parsed_data:
+                        logger.warning(f"Отсутствует обязательное поле: {field}, добавляем значение по умолчанию")
+                        # Добавляем значения по умолчанию для отсутствующих полей
+                        parsed_data[field] = _FIELD_DEFAULTS.get(field, 0)
+                
+                # Валидируем результат
+                validated_data = self.validator.validate(parsed_data)
+                
+                return validated_data
+                
         except json.JSONDecodeError as e:
             logger.error(f"Ошибка парсинга JSON: {e}")
             return None
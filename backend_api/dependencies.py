@@ -2,14 +2,18 @@
 Authentication and dependency injection for FastAPI
 """
 import hmac
-import hashlib
 import json
-from urllib.parse import parse_qs
+from functools import lru_cache
+from operator import itemgetter
+from urllib.parse import parse_qsl
 from typing import Optional
 from fastapi import Header, HTTPException, Depends
 import os
 import logging
 
+from core.cache import TTLCache
+from core.database import Database
+
 logger = logging.getLogger(__name__)
 
 # Get bot token from environment
@@ -18,10 +22,56 @@ if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN not found in environment")
 
 
+@lru_cache(maxsize=4)
+def secret_key(bot_token: str) -> bytes:
+    """
+    Derive the initData secret key for a bot token
+    
+    The key depends only on the token, so it is computed once per token.
+    
+    Args:
+        bot_token: Telegram bot token
+        
+    Returns:
+        HMAC-SHA256("WebAppData", bot_token) digest
+    """
+    return hmac.digest(b"WebAppData", bot_token.encode(), "sha256")
+
+
+# Verified initData results; the Mini App sends the same initData on every request
+INIT_DATA_CACHE_TTL_SECONDS = 60
+INIT_DATA_CACHE_MAX_SIZE = 10_000
+_init_data_cache = TTLCache(maxsize=INIT_DATA_CACHE_MAX_SIZE, ttl=INIT_DATA_CACHE_TTL_SECONDS)
+
+
 def validate_init_data(init_data: str) -> dict:
     """
     Validate Telegram WebApp initData signature
     
+    Successful results are cached by the raw initData string for
+    INIT_DATA_CACHE_TTL_SECONDS, so repeated requests skip HMAC verification.
+    
+    Args:
+        init_data: Raw initData string from Telegram WebApp
+        
+    Returns:
+        Parsed and validated user data
+        
+    Raises:
+        ValueError: If signature is invalid
+    """
+    user_data = _init_data_cache.get(init_data)
+    if user_data is None:
+        user_data = _verify_init_data(init_data)
+        _init_data_cache[init_data] = user_data
+    
+    return dict(user_data)
+
+
+def _verify_init_data(init_data: str) -> dict:
+    """
+    Verify initData signature and parse user data (uncached)
+    
     Args:
         init_data: Raw initData string from Telegram WebApp
         
@@ -32,44 +82,43 @@ def validate_init_data(init_data: str) -> dict:
         ValueError: If signature is invalid
     """
     try:
-        # Parse query string
-        parsed = parse_qs(init_data)
+        # Parse query string (first value wins, blank values skipped)
+        parsed = {}
+        for key, value in parse_qsl(init_data):
+            parsed.setdefault(key, value)
         
         # Extract hash
-        received_hash = parsed.get('hash', [None])[0]
+        received_hash = parsed.pop('hash', None)
         if not received_hash:
             raise ValueError("No hash in initData")
         
-        # Remove hash from data for validation
-        data_check_string_parts = []
-        for key in sorted(parsed.keys()):
-            if key == 'hash':
-                continue
-            value = parsed[key][0]
-            data_check_string_parts.append(f"{key}={value}")
-        
-        data_check_string = '\n'.join(data_check_string_parts)
-        
-        # Calculate secret key
-        secret_key = hmac.new(
-            b"WebAppData",
-            BOT_TOKEN.encode(),
-            hashlib.sha256
-        ).digest()
-        
-        # Calculate hash
-        calculated_hash = hmac.new(
-            secret_key,
+        # Reject malformed hashes before doing any HMAC work: a SHA-256
+        # signature is exactly 64 hex characters
+        if len(received_hash) != 64:
+            raise ValueError("Invalid signature")
+        try:
+            received_digest = bytes.fromhex(received_hash)
+        except ValueError:
+            raise ValueError("Invalid signature")
+        
+        # Build data check string from the remaining fields
+        data_check_string = '\n'.join(
+            f"{key}={value}" for key, value in sorted(parsed.items(), key=itemgetter(0))
+        )
+        
+        # Calculate hash (one-shot hmac.digest runs entirely in OpenSSL)
+        calculated_hash = hmac.digest(
+            secret_key(BOT_TOKEN),
             data_check_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
+            "sha256"
+        )
         
-        # Verify hash
-        if not hmac.compare_digest(calculated_hash, received_hash):
+        # Verify hash (compare raw 32-byte digests, not hex strings)
+        if not hmac.compare_digest(calculated_hash, received_digest):
             raise ValueError("Invalid signature")
         
         # Parse user data
-        user_data = json.loads(parsed.get('user', ['{}'])[0])
+        user_data = json.loads(parsed.get('user', '{}'))
         
         return {
             'user_id': user_data.get('id'),
@@ -77,8 +126,8 @@ def validate_init_data(init_data: str) -> dict:
             'first_name': user_data.get('first_name'),
             'last_name': user_data.get('last_name'),
             'language_code': user_data.get('language_code'),
-            'auth_date': parsed.get('auth_date', [None])[0],
-            'query_id': parsed.get('query_id', [None])[0]
+            'auth_date': parsed.get('auth_date'),
+            'query_id': parsed.get('query_id')
         }
         
     except Exception as e:
@@ -92,6 +141,9 @@ async def get_current_user(
     """
     Dependency to get current authenticated user from Telegram WebApp initData
     
+    Kept as async def with the HMAC check inline: it is CPU-only and short,
+    and a sync dependency would be dispatched to the threadpool.
+    
     Args:
         x_telegram_init_data: initData from request header
         
@@ -134,6 +186,20 @@ async def get_current_user(
         )
 
 
+# Shared database instance for the whole API process
+db = Database()
+
+
+async def get_db() -> Database:
+    """
+    Dependency that provides the shared Database instance
+    
+    Returns:
+        Database used by all routers
+    """
+    return db
+
+
 # Optional: Dependency for internal bot requests (without initData validation)
 async def get_user_from_token(
     x_bot_token: Optional[str] = Header(None, alias="X-Bot-Token")
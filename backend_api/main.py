@@ -5,12 +5,12 @@ import os
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
 import logging
 
-from core.database import Database
+from backend_api.dependencies import db
 from backend_api.routers import auth, user, nutrition, analytics
 from backend_api.models import ErrorResponse
 
@@ -21,8 +21,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Database instance
-db = Database()
+# DEBUG=false / DEBUG=0 must not count as enabled
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
 
 
 @asynccontextmanager
@@ -41,6 +41,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Backend API...")
+    await db.close()
 
 
 # Create FastAPI app
@@ -48,7 +49,8 @@ app = FastAPI(
     title="Fitness AI Coach API",
     description="Backend API for Telegram Mini App",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -68,7 +70,7 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation errors"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "error_code": "VALIDATION_ERROR",
@@ -82,12 +84,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected errors"""
     logger.error(f"Unexpected error: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "error_code": "INTERNAL_SERVER_ERROR",
             "message": "An unexpected error occurred",
-            "details": {"error": str(exc)} if os.getenv("DEBUG") else None
+            "details": {"error": str(exc)} if DEBUG else None
         }
     )
 
@@ -120,9 +122,14 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
+    
+    # Auto-reload only works with a single worker, so keep it for DEBUG runs
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        loop="uvloop",
+        http="httptools",
+        reload=DEBUG,
+        workers=1 if DEBUG else int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 2))
     )
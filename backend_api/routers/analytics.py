@@ -2,22 +2,32 @@
 Analytics router
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 from typing import List
 
+import numpy as np
+
 from backend_api.dependencies import get_current_user
 from backend_api.models import (
     WeightData, CalorieData, AnalyticsPeriod,
     WeightDataPoint, CalorieDataPoint, MacroNutrients
 )
 from backend_api.utils import calculate_date_range
-from core.database import Database
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-db = Database()
+
+
+def _date_axis(start_date: datetime, end_date: datetime) -> np.ndarray:
+    """Daily datetime64 axis from start_date to end_date inclusive"""
+    first_day = np.datetime64(start_date.date())
+    return np.arange(
+        first_day,
+        first_day + (end_date - start_date).days + 1,
+        dtype='datetime64[D]'
+    )
 
 
 @router.get("/weight", response_model=WeightData)
@@ -40,31 +50,27 @@ async def get_weight_analytics(
         # TODO: Implement weight_history query
         # For now, return mock data
         
-        data_points = []
-        current_date = start_date
+        dates = _date_axis(start_date, end_date)
+        n_days = len(dates)
         base_weight = 75.0  # Mock starting weight
         
-        while current_date <= end_date:
-            # Mock weight data with slight variation
-            weight = base_weight + (current_date - start_date).days * 0.1
-            data_points.append(WeightDataPoint(
-                date=current_date.strftime("%Y-%m-%d"),
-                weight=round(weight, 1)
-            ))
-            current_date += timedelta(days=1)
+        # Mock weight data with slight variation
+        weights = np.round(base_weight + np.arange(n_days) * 0.1, 1)
+        
+        data_points = [
+            WeightDataPoint(date=day, weight=weight)
+            for day, weight in zip(np.datetime_as_string(dates).tolist(), weights.tolist())
+        ]
         
         # Calculate average
-        if data_points:
-            average = sum(dp.weight for dp in data_points) / len(data_points)
-            average = round(average, 1)
+        if n_days:
+            average = round(float(weights.mean()), 1)
         else:
             average = None
         
         # Determine trend
-        if len(data_points) >= 2:
-            first_weight = data_points[0].weight
-            last_weight = data_points[-1].weight
-            diff = last_weight - first_weight
+        if n_days >= 2:
+            diff = float(weights[-1] - weights[0])
             
             if diff > 0.5:
                 trend = "increasing"
@@ -113,26 +119,34 @@ async def get_calorie_analytics(
         # TODO: Implement daily_stats query for date range
         # For now, return mock data
         
-        data_points = []
-        current_date = start_date
+        dates = _date_axis(start_date, end_date)
+        n_days = len(dates)
+        month_days = (dates - dates.astype('datetime64[M]')).astype(np.int64) + 1
         
-        while current_date <= end_date:
-            # Mock calorie data
-            data_points.append(CalorieDataPoint(
-                date=current_date.strftime("%Y-%m-%d"),
-                calories=1800 + (current_date.day % 7) * 100,
-                protein=120 + (current_date.day % 5) * 10,
-                fats=60 + (current_date.day % 4) * 5,
-                carbs=200 + (current_date.day % 6) * 20
-            ))
-            current_date += timedelta(days=1)
+        # Mock calorie data: rows are calories, protein, fats, carbs
+        macros = np.stack([
+            1800 + (month_days % 7) * 100,
+            120 + (month_days % 5) * 10,
+            60 + (month_days % 4) * 5,
+            200 + (month_days % 6) * 20
+        ]).astype(np.float64)
+        
+        data_points = [
+            CalorieDataPoint(
+                date=day,
+                calories=calories,
+                protein=protein,
+                fats=fats,
+                carbs=carbs
+            )
+            for day, (calories, protein, fats, carbs) in zip(
+                np.datetime_as_string(dates).tolist(), macros.T.tolist()
+            )
+        ]
         
         # Calculate daily averages
-        if data_points:
-            avg_calories = sum(dp.calories for dp in data_points) / len(data_points)
-            avg_protein = sum(dp.protein for dp in data_points) / len(data_points)
-            avg_fats = sum(dp.fats for dp in data_points) / len(data_points)
-            avg_carbs = sum(dp.carbs for dp in data_points) / len(data_points)
+        if n_days:
+            avg_calories, avg_protein, avg_fats, avg_carbs = macros.mean(axis=1).tolist()
             
             daily_average = MacroNutrients(
                 calories=round(avg_calories, 1),
@@ -1,20 +1,24 @@
 """
 Nutrition management router
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
-import os
-import json
+from pathlib import Path
+import asyncio
+import time
+import orjson
 import logging
 from typing import List, Optional
 
-from backend_api.dependencies import get_current_user
+from backend_api.dependencies import get_current_user, get_db
 from backend_api.models import (
     AnalysisResult, MealCreate, MealUpdate, Meal,
-    Ingredient, MacroNutrients
+    Ingredient, MacroNutrients, MealTime
 )
 from backend_api.utils import (
     generate_unique_filename,
+    save_upload_file,
     calculate_macros_from_ingredients,
     parse_date_from_string,
     format_date_for_db
@@ -26,13 +30,62 @@ from modules.video_analysis.video_analyzer import VideoAnalyzer
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-db = Database()
+
+# Upload directory (created and served by main.py)
+_UPLOADS = Path("uploads")
 
 # Initialize analyzers
 photo_analyzer = PhotoAnalyzer()
 video_analyzer = VideoAnalyzer()
 
 
+def _ingredient_from_comp(comp: dict) -> Ingredient:
+    """Build response Ingredient from a stored meal component (no validation)"""
+    get = comp.get
+    return Ingredient.model_construct(
+        name=get('name', 'Unknown'),
+        weight=get('weight_g', 0),
+        calories=get('calories', 0),
+        protein=get('protein_g', 0),
+        fats=get('fat_g', 0),
+        carbs=get('carbs_g', 0),
+        confidence=get('confidence', 0.5)
+    )
+
+
+def _comp_from_ingredient(ing: Ingredient) -> dict:
+    """Convert request Ingredient to the stored meal component format"""
+    return {
+        'name': ing.name,
+        'weight_g': ing.weight,
+        'calories': ing.calories,
+        'protein_g': ing.protein,
+        'fat_g': ing.fats,
+        'carbs_g': ing.carbs,
+        'confidence': ing.confidence
+    }
+
+
+def _summarize_ingredients(ingredients: List[Ingredient]) -> tuple:
+    """
+    Summarize request ingredients for storage
+    
+    Args:
+        ingredients: Validated ingredients from the request
+        
+    Returns:
+        Tuple of (stored components, macro totals, total weight, average confidence)
+    """
+    components = [_comp_from_ingredient(ing) for ing in ingredients]
+    totals = calculate_macros_from_ingredients([dict(ing) for ing in ingredients])
+    weight = totals.pop('weight')
+    
+    confidences = [ing.confidence for ing in ingredients if ing.confidence]
+    avg_confidence = sum(confidences) / len(confidences) if confidences else 0.5
+    
+    return components, totals, weight, avg_confidence
+
+
 @router.post("/analyze-photo", response_model=AnalysisResult)
 async def analyze_photo(
     file: UploadFile = File(...),
@@ -58,21 +111,26 @@ async def analyze_photo(
     try:
         # Generate unique filename
         filename = generate_unique_filename(file.filename, prefix=f"user_{user_id}")
-        file_path = os.path.join("uploads", filename)
+        file_path = str(_UPLOADS / filename)
         
-        # Save file
+        # Save file in a worker thread while the photo is being analyzed;
+        # the analyzer works on the in-memory bytes, not the saved file
         content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        logger.info(f"Photo saved: {file_path}")
+        write_task = asyncio.create_task(
+            run_in_threadpool(Path(file_path).write_bytes, content)
+        )
         
         # Analyze photo
-        analysis = await photo_analyzer.analyze(content)
+        try:
+            analysis = await photo_analyzer.analyze(content)
+        finally:
+            await write_task
+        
+        logger.info(f"Photo saved: {file_path}")
         
         # Parse analysis result
         if isinstance(analysis, str):
-            analysis = json.loads(analysis)
+            analysis = orjson.loads(analysis)
         
         # Build ingredients list
         ingredients = []
@@ -141,12 +199,10 @@ async def analyze_video(
     try:
         # Generate unique filename
         filename = generate_unique_filename(file.filename, prefix=f"user_{user_id}_video")
-        file_path = os.path.join("uploads", filename)
+        file_path = str(_UPLOADS / filename)
         
-        # Save file
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Stream file to disk (video analyzer reads it by path)
+        await save_upload_file(file, file_path)
         
         logger.info(f"Video saved: {file_path}")
         
@@ -155,7 +211,7 @@ async def analyze_video(
         
         # Parse analysis result (same structure as photo)
         if isinstance(analysis, str):
-            analysis = json.loads(analysis)
+            analysis = orjson.loads(analysis)
         
         # Build ingredients list
         ingredients = []
@@ -202,7 +258,8 @@ async def analyze_video(
 @router.post("/meals", response_model=Meal)
 async def create_meal(
     meal_data: MealCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     """
     Create a new meal record
@@ -212,23 +269,21 @@ async def create_meal(
     user_id = current_user['user_id']
     
     try:
-        # Calculate total nutrition from ingredients
-        ingredients_list = [ing.dict() for ing in meal_data.ingredients]
-        totals = calculate_macros_from_ingredients(ingredients_list)
-        
-        # Calculate average confidence
-        confidences = [ing.confidence for ing in meal_data.ingredients if ing.confidence]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.5
+        # Components, nutrition totals and average confidence in one pass
+        components, totals, total_weight, avg_confidence = _summarize_ingredients(
+            meal_data.ingredients
+        )
         
         # Prepare meal data for database
+        now = datetime.now()
         meal_db_data = {
             'user_id': user_id,
-            'session_id': f"meal_{user_id}_{datetime.now().timestamp()}",
+            'session_id': f"meal_{user_id}_{time.time_ns()}",
             'dish_name': meal_data.dish_name or "Meal",
             'meal_type': meal_data.meal_time.value,
             'photo_file_id': meal_data.photo_path,
-            'components': json.dumps(ingredients_list, ensure_ascii=False),
-            'total_weight': sum(ing.weight for ing in meal_data.ingredients),
+            'components': components,
+            'total_weight': total_weight,
             'total_calories': int(totals['calories']),
             'protein_g': int(totals['protein']),
             'fat_g': int(totals['fats']),
@@ -236,14 +291,14 @@ async def create_meal(
             'health_score': 7,  # Default score
             'confidence_avg': avg_confidence,
             'corrections_count': 0,
-            'eaten_at': datetime.now()
+            'eaten_at': now
         }
         
         # Save meal
         meal_id = await db.save_meal(meal_db_data)
         
-        # Return created meal
-        return Meal(
+        # Return created meal (fields are already validated, skip re-validation)
+        return Meal.model_construct(
             id=meal_id,
             user_id=user_id,
             meal_time=meal_data.meal_time,
@@ -254,7 +309,7 @@ async def create_meal(
             protein=totals['protein'],
             fats=totals['fats'],
             carbs=totals['carbs'],
-            created_at=datetime.now(),
+            created_at=now,
             dish_name=meal_data.dish_name,
             health_score=7
         )
@@ -273,7 +328,8 @@ async def create_meal(
 @router.get("/meals", response_model=List[Meal])
 async def get_meals(
     date: Optional[str] = Query(None, description="Date in YYYY-MM-DD format"),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     """
     Get meals for user
@@ -284,11 +340,11 @@ async def get_meals(
     user_id = current_user['user_id']
     
     try:
-        # Get meals
+        # Get meals (already ordered by meal_time in SQL)
         if date:
             # Validate and parse date
             try:
-                parse_date_from_string(date)
+                day = parse_date_from_string(date)
             except ValueError as e:
                 raise HTTPException(
                     status_code=400,
@@ -299,39 +355,25 @@ async def get_meals(
                 )
             
             # Get meals for specific date
-            # For now, use get_meals_today and filter (can be optimized later)
-            meals = await db.get_meals_today(user_id)
-            # Filter by date
-            meals = [m for m in meals if m['eaten_at'].startswith(date)]
+            meals = await db.get_meals_by_date(user_id, day)
         else:
             # Get today's meals
             meals = await db.get_meals_today(user_id)
         
-        # Convert to Meal objects
+        # Convert to Meal objects (rows were written by us, skip validation)
         result = []
         for meal in meals:
             # Parse components
             components = meal.get('components', '[]')
             if isinstance(components, str):
-                components = json.loads(components)
+                components = orjson.loads(components)
             
-            ingredients = [
-                Ingredient(
-                    name=comp.get('name', 'Unknown'),
-                    weight=comp.get('weight_g', 0),
-                    calories=comp.get('calories', 0),
-                    protein=comp.get('protein_g', 0),
-                    fats=comp.get('fat_g', 0),
-                    carbs=comp.get('carbs_g', 0),
-                    confidence=comp.get('confidence', 0.5)
-                )
-                for comp in components
-            ]
+            ingredients = [_ingredient_from_comp(comp) for comp in components]
             
-            result.append(Meal(
+            result.append(Meal.model_construct(
                 id=meal['meal_id'],
                 user_id=meal['user_id'],
-                meal_time=meal.get('meal_type', 'snack'),
+                meal_time=MealTime(meal.get('meal_type') or 'snack'),
                 photo_path=meal.get('photo_file_id'),
                 video_path=None,
                 ingredients=ingredients,
@@ -344,10 +386,6 @@ async def get_meals(
                 health_score=meal.get('health_score')
             ))
         
-        # Sort by meal_time order
-        meal_time_order = {'breakfast': 0, 'lunch': 1, 'dinner': 2, 'snack': 3}
-        result.sort(key=lambda m: meal_time_order.get(m.meal_time, 4))
-        
         return result
         
     except HTTPException:
@@ -363,11 +401,37 @@ async def get_meals(
         )
 
 
+async def _raise_meal_access_error(db: Database, meal_id: int, action: str):
+    """
+    Raise the right error after an ownership-scoped query missed
+    
+    Only runs on the failure path: 403 if the meal belongs to someone else,
+    404 if it does not exist.
+    """
+    if await db.meal_exists(meal_id):
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "error_code": "FORBIDDEN",
+                "message": f"You don't have permission to {action} this meal"
+            }
+        )
+    
+    raise HTTPException(
+        status_code=404,
+        detail={
+            "error_code": "MEAL_NOT_FOUND",
+            "message": f"Meal {meal_id} not found"
+        }
+    )
+
+
 @router.patch("/meals/{meal_id}", response_model=Meal)
 async def update_meal(
     meal_id: int,
     meal_update: MealUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     """
     Update meal record
@@ -377,27 +441,11 @@ async def update_meal(
     user_id = current_user['user_id']
     
     try:
-        # Get existing meal
-        meal = await db.get_meal_by_id(meal_id)
+        # Get existing meal (ownership is part of the query)
+        meal = await db.get_meal_by_id(meal_id, user_id)
         
         if not meal:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error_code": "MEAL_NOT_FOUND",
-                    "message": f"Meal {meal_id} not found"
-                }
-            )
-        
-        # Verify ownership
-        if meal['user_id'] != user_id:
-            raise HTTPException(
-                status_code=403,
-                detail={
-                    "error_code": "FORBIDDEN",
-                    "message": "You don't have permission to update this meal"
-                }
-            )
+            await _raise_meal_access_error(db, meal_id, "update")
         
         # Build update dictionary
         update_data = {}
@@ -410,56 +458,49 @@ async def update_meal(
         
         if meal_update.ingredients:
             # Recalculate nutrition
-            ingredients_list = [ing.dict() for ing in meal_update.ingredients]
-            totals = calculate_macros_from_ingredients(ingredients_list)
+            components, totals, total_weight, _ = _summarize_ingredients(
+                meal_update.ingredients
+            )
             
-            update_data['components'] = ingredients_list
-            update_data['total_weight'] = sum(ing.weight for ing in meal_update.ingredients)
+            update_data['components'] = components
+            update_data['total_weight'] = total_weight
             update_data['total_calories'] = int(totals['calories'])
             update_data['protein_g'] = int(totals['protein'])
             update_data['fat_g'] = int(totals['fats'])
             update_data['carbs_g'] = int(totals['carbs'])
             update_data['corrections_count'] = meal.get('corrections_count', 0) + 1
         
-        # Update meal
+        # Update meal and merge changes into the row already loaded above
         if update_data:
-            await db.update_meal(meal_id, **update_data)
-        
-        # Get updated meal
-        updated_meal = await db.get_meal_by_id(meal_id)
-        
-        # Parse components
-        components = updated_meal.get('components', '[]')
-        if isinstance(components, str):
-            components = json.loads(components)
-        
-        ingredients = [
-            Ingredient(
-                name=comp.get('name', 'Unknown'),
-                weight=comp.get('weight_g', 0),
-                calories=comp.get('calories', 0),
-                protein=comp.get('protein_g', 0),
-                fats=comp.get('fat_g', 0),
-                carbs=comp.get('carbs_g', 0),
-                confidence=comp.get('confidence', 0.5)
-            )
-            for comp in components
-        ]
-        
-        return Meal(
-            id=updated_meal['meal_id'],
-            user_id=updated_meal['user_id'],
-            meal_time=updated_meal.get('meal_type', 'snack'),
-            photo_path=updated_meal.get('photo_file_id'),
+            if not await db.update_meal(meal_id, user_id, **update_data):
+                await _raise_meal_access_error(db, meal_id, "update")
+            meal.update(update_data)
+        
+        if meal_update.ingredients:
+            # New ingredients come straight from the validated request
+            ingredients = meal_update.ingredients
+        else:
+            # Parse stored components
+            components = meal.get('components') or '[]'
+            if isinstance(components, str):
+                components = orjson.loads(components)
+            
+            ingredients = [_ingredient_from_comp(comp) for comp in components]
+        
+        return Meal.model_construct(
+            id=meal['meal_id'],
+            user_id=meal['user_id'],
+            meal_time=MealTime(meal.get('meal_type') or 'snack'),
+            photo_path=meal.get('photo_file_id'),
             video_path=None,
             ingredients=ingredients,
-            calories=updated_meal.get('total_calories', 0),
-            protein=updated_meal.get('protein_g', 0),
-            fats=updated_meal.get('fat_g', 0),
-            carbs=updated_meal.get('carbs_g', 0),
-            created_at=datetime.fromisoformat(updated_meal['eaten_at']) if isinstance(updated_meal['eaten_at'], str) else updated_meal['eaten_at'],
-            dish_name=updated_meal.get('dish_name'),
-            health_score=updated_meal.get('health_score')
+            calories=meal.get('total_calories', 0),
+            protein=meal.get('protein_g', 0),
+            fats=meal.get('fat_g', 0),
+            carbs=meal.get('carbs_g', 0),
+            created_at=datetime.fromisoformat(meal['eaten_at']) if isinstance(meal['eaten_at'], str) else meal['eaten_at'],
+            dish_name=meal.get('dish_name'),
+            health_score=meal.get('health_score')
         )
         
     except HTTPException:
@@ -475,10 +516,11 @@ async def update_meal(
         )
 
 
-@router.delete("/meals/{meal_id}", status_code=204)
+@router.delete("/meals/{meal_id}", status_code=204, response_class=Response)
 async def delete_meal(
     meal_id: int,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     """
     Delete meal record
@@ -488,33 +530,12 @@ async def delete_meal(
     user_id = current_user['user_id']
     
     try:
-        # Get existing meal
-        meal = await db.get_meal_by_id(meal_id)
-        
-        if not meal:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "error_code": "MEAL_NOT_FOUND",
-                    "message": f"Meal {meal_id} not found"
-                }
-            )
-        
-        # Verify ownership
-        if meal['user_id'] != user_id:
-            raise HTTPException(
-                status_code=403,
-                detail={
-                    "error_code": "FORBIDDEN",
-                    "message": "You don't have permission to delete this meal"
-                }
-            )
-        
-        # Delete meal
-        await db.delete_meal(meal_id)
+        # Delete meal (ownership is part of the query)
+        if not await db.delete_meal(meal_id, user_id):
+            await _raise_meal_access_error(db, meal_id, "delete")
         
-        # Return 204 No Content (no body)
-        return None
+        # Return 204 No Content directly, bypassing response serialization
+        return Response(status_code=204)
         
     except HTTPException:
         raise
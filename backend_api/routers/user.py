@@ -3,24 +3,27 @@ User management router
 """
 from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime, date
+import orjson
 import logging
 
-from backend_api.dependencies import get_current_user
+from backend_api.dependencies import get_current_user, get_db
 from backend_api.models import (
     UserProfile, UserProfileUpdate, DailyStats,
     MacroNutrients, UserGoals
 )
-from backend_api.utils import calculate_progress_percentage, format_date_for_db
+from backend_api.utils import format_date_for_db
 from core.database import Database
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-db = Database()
 
 
 @router.get("/profile", response_model=UserProfile)
-async def get_user_profile(current_user: dict = Depends(get_current_user)):
+async def get_user_profile(
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
     """
     Get user profile
     
@@ -41,10 +44,9 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
         )
     
     # Parse goals from JSON string if needed
-    import json
     goals_data = user.get('goals')
     if isinstance(goals_data, str):
-        goals_data = json.loads(goals_data)
+        goals_data = orjson.loads(goals_data)
     
     # Build goals object
     goals = UserGoals(
@@ -70,7 +72,8 @@ async def get_user_profile(current_user: dict = Depends(get_current_user)):
 @router.patch("/profile", response_model=UserProfile)
 async def update_user_profile(
     profile_update: UserProfileUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
 ):
     """
     Update user profile
@@ -109,11 +112,14 @@ async def update_user_profile(
         await db.update_user(user_id, **update_data)
     
     # Return updated profile
-    return await get_user_profile(current_user)
+    return await get_user_profile(current_user, db)
 
 
 @router.get("/stats/today", response_model=DailyStats)
-async def get_today_stats(current_user: dict = Depends(get_current_user)):
+async def get_today_stats(
+    current_user: dict = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
     """
     Get today's nutrition statistics
     
@@ -132,14 +138,12 @@ async def get_today_stats(current_user: dict = Depends(get_current_user)):
             }
         )
     
-    # Get today's meals
-    meals = await db.get_meals_today(user_id)
-    
-    # Calculate consumed totals
-    total_calories = sum(meal.get('total_calories', 0) for meal in meals)
-    total_protein = sum(meal.get('protein_g', 0) for meal in meals)
-    total_fats = sum(meal.get('fat_g', 0) for meal in meals)
-    total_carbs = sum(meal.get('carbs_g', 0) for meal in meals)
+    # Get today's consumed totals (aggregated in SQL)
+    totals = await db.get_daily_totals(user_id)
+    total_calories = totals['total_calories']
+    total_protein = totals['protein_g']
+    total_fats = totals['fat_g']
+    total_carbs = totals['carbs_g']
     
     # Get goals
     goal_calories = user.get('daily_calories', 2000)
@@ -149,10 +153,13 @@ async def get_today_stats(current_user: dict = Depends(get_current_user)):
     
     # Calculate progress
     progress = {
-        'calories': calculate_progress_percentage(total_calories, goal_calories),
-        'protein': calculate_progress_percentage(total_protein, goal_protein),
-        'fats': calculate_progress_percentage(total_fats, goal_fats),
-        'carbs': calculate_progress_percentage(total_carbs, goal_carbs)
+        key: round(consumed * 100.0 / goal, 1) if goal > 0 else 0.0
+        for key, consumed, goal in (
+            ('calories', total_calories, goal_calories),
+            ('protein', total_protein, goal_protein),
+            ('fats', total_fats, goal_fats),
+            ('carbs', total_carbs, goal_carbs)
+        )
     }
     
     return DailyStats(
@@ -170,5 +177,5 @@ async def get_today_stats(current_user: dict = Depends(get_current_user)):
             carbs=goal_carbs
         ),
         progress=progress,
-        meals_count=len(meals)
+        meals_count=totals['meals_count']
     )
@@ -7,7 +7,8 @@ import hashlib
 import json
 from urllib.parse import urlencode
 
-from backend_api.dependencies import validate_init_data
+from backend_api import dependencies
+from backend_api.dependencies import secret_key, validate_init_data
 
 
 def create_valid_init_data(user_data: dict, bot_token: str) -> str:
@@ -31,16 +32,9 @@ def create_valid_init_data(user_data: dict, bot_token: str) -> str:
     # Sort keys and create data check string
     data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(data.items()))
     
-    # Calculate secret key
-    secret_key = hmac.new(
-        b"WebAppData",
-        bot_token.encode(),
-        hashlib.sha256
-    ).digest()
-    
     # Calculate hash
     hash_value = hmac.new(
-        secret_key,
+        secret_key(bot_token),
         data_check_string.encode(),
         hashlib.sha256
     ).hexdigest()
@@ -75,6 +69,62 @@ def test_validate_init_data_valid():
     assert result['last_name'] == 'User'
 
 
+def test_validate_init_data_cached():
+    """Test that repeated validation is served from cache"""
+    import os
+    bot_token = os.getenv('TELEGRAM_BOT_TOKEN', 'test_token_123')
+    
+    init_data = create_valid_init_data({'id': 777, 'username': 'cached'}, bot_token)
+    
+    first = validate_init_data(init_data)
+    assert init_data in dependencies._init_data_cache
+    
+    # Mutating the returned dict must not affect cached data
+    first['user_id'] = None
+    
+    second = validate_init_data(init_data)
+    assert second['user_id'] == 777
+    assert second['username'] == 'cached'
+
+
+def test_validate_init_data_invalid_not_cached():
+    """Test that failed validation is not cached"""
+    init_data = urlencode({
+        'user': json.dumps({'id': 12345}),
+        'auth_date': '1234567890',
+        'hash': '00' * 32
+    })
+    
+    with pytest.raises(ValueError):
+        validate_init_data(init_data)
+    
+    assert init_data not in dependencies._init_data_cache
+
+
+def test_secret_key_derived_once_per_token():
+    """Test that the initData secret key is cached per bot token"""
+    secret_key.cache_clear()
+    
+    first = secret_key('cached_token')
+    second = secret_key('cached_token')
+    
+    assert first is second
+    assert secret_key.cache_info().hits == 1
+    assert secret_key.cache_info().misses == 1
+
+
+def test_validate_init_data_malformed_hash():
+    """Test that hashes of the wrong length are rejected"""
+    init_data = urlencode({
+        'user': json.dumps({'id': 12345}),
+        'auth_date': '1234567890',
+        'hash': 'ab' * 31
+    })
+    
+    with pytest.raises(ValueError, match="Invalid signature"):
+        validate_init_data(init_data)
+
+
 def test_validate_init_data_invalid_signature():
     """Test validation with invalid signature"""
     init_data = urlencode({
@@ -123,14 +173,8 @@ def test_validate_init_data_missing_user():
     
     data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(data.items()))
     
-    secret_key = hmac.new(
-        b"WebAppData",
-        bot_token.encode(),
-        hashlib.sha256
-    ).digest()
-    
     hash_value = hmac.new(
-        secret_key,
+        secret_key(bot_token),
         data_check_string.encode(),
         hashlib.sha256
     ).hexdigest()
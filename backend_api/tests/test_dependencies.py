@@ -1,9 +1,10 @@
 """
 Unit tests for FastAPI dependencies
 """
+import inspect
 import pytest
 from fastapi import HTTPException
-from backend_api.dependencies import get_current_user
+from backend_api.dependencies import get_current_user, get_db, get_user_from_token
 from backend_api.tests.test_auth import create_valid_init_data
 import os
 
@@ -68,5 +69,11 @@ async def test_get_current_user_missing_user_id():
     assert exc_info.value.detail['error_code'] == 'INVALID_USER_ID'
 
 
+@pytest.mark.parametrize("dependency", [get_current_user, get_db, get_user_from_token])
+def test_dependencies_are_async(dependency):
+    """Dependencies must be async so FastAPI awaits them instead of using the threadpool"""
+    assert inspect.iscoroutinefunction(dependency)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
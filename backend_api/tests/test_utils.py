@@ -0,0 +1,69 @@
+"""
+Unit tests for backend utilities
+"""
+import pytest
+
+from backend_api import utils
+from backend_api.utils import (
+    calculate_macros_from_ingredients,
+    validate_nutrition_data,
+    validate_nutrition_data_batch
+)
+
+
+def _ingredients(count):
+    return [
+        {'calories': 120.33, 'protein': 5.12, 'fats': 3.3, 'carbs': 10.07, 'weight': 100 + i}
+        for i in range(count)
+    ]
+
+
+def test_calculate_macros_small_list():
+    """Test totals for a list summed with the plain loop"""
+    totals = calculate_macros_from_ingredients(_ingredients(3))
+    
+    assert totals == {
+        'calories': 361.0,
+        'protein': 15.4,
+        'fats': 9.9,
+        'carbs': 30.2,
+        'weight': 303
+    }
+
+
+def test_calculate_macros_vectorized_matches_loop(monkeypatch):
+    """Test the numpy path gives the same totals as the loop"""
+    ingredients = _ingredients(20)
+    vectorized = calculate_macros_from_ingredients(ingredients)
+    
+    monkeypatch.setattr(utils, "_VECTORIZE_MIN_INGREDIENTS", len(ingredients) + 1)
+    assert calculate_macros_from_ingredients(ingredients) == pytest.approx(vectorized)
+
+
+def test_calculate_macros_missing_fields():
+    """Test missing fields count as zero"""
+    totals = calculate_macros_from_ingredients([{'calories': 100}, {}])
+    
+    assert totals == {'calories': 100, 'protein': 0, 'fats': 0, 'carbs': 0, 'weight': 0}
+
+
+def test_validate_nutrition_data_batch():
+    """Test the batch check flags rows outside the 10% tolerance"""
+    rows = [
+        [400, 20, 10, 55],   # 390 kcal from macros
+        [600, 20, 10, 55],   # far above
+        [352, 20, 10, 55],   # just inside the lower bound
+        [0, 0, 0, 0],
+    ]
+    
+    assert validate_nutrition_data_batch(rows).tolist() == [True, False, True, True]
+
+
+def test_validate_nutrition_data_single_row():
+    """Test the scalar check agrees with the batch version"""
+    assert validate_nutrition_data(400, 20, 10, 55) is True
+    assert validate_nutrition_data(600, 20, 10, 55) is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,12 +1,19 @@
 """
 Utility functions for Backend API
 """
-import uuid
 import os
+import secrets
+import shutil
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 import logging
 
+import numpy as np
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,10 +32,14 @@ def generate_unique_filename(original_filename: str, prefix: str = "") -> str:
     _, ext = os.path.splitext(original_filename)
     
     # Generate unique ID
-    unique_id = uuid.uuid4().hex[:12]
+    unique_id = secrets.token_hex(6)
     
-    # Create timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Create timestamp (YYYYMMDD_HHMMSS) from struct_time, no datetime needed
+    t = time.localtime()
+    timestamp = (
+        f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}_"
+        f"{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}"
+    )
     
     # Combine parts
     if prefix:
@@ -39,68 +50,94 @@ def generate_unique_filename(original_filename: str, prefix: str = "") -> str:
     return filename
 
 
-def calculate_date_range(period: str) -> tuple[datetime, datetime]:
+async def save_upload_file(upload: UploadFile, file_path: str, chunk_size: int = 1 << 20) -> None:
     """
-    Calculate date range based on period
+    Stream uploaded file to disk in fixed-size chunks
+    
+    Copies from the spooled upload in a worker thread, so the whole file is
+    never held in memory and the event loop is not blocked.
     
     Args:
-        period: "week", "month", or "year"
-        
-    Returns:
-        Tuple of (start_date, end_date)
+        upload: Uploaded file
+        file_path: Destination path
+        chunk_size: Copy buffer size in bytes
     """
-    end_date = datetime.now()
+    def _copy():
+        upload.file.seek(0)
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(upload.file, f, chunk_size)
     
-    if period == "week":
-        start_date = end_date - timedelta(days=7)
-    elif period == "month":
-        start_date = end_date - timedelta(days=30)
-    elif period == "year":
-        start_date = end_date - timedelta(days=365)
-    else:
+    await run_in_threadpool(_copy)
+
+
+_PERIOD_DAYS = {"week": 7, "month": 30, "year": 365}
+
+
+@lru_cache(maxsize=16)
+def _date_range_for_minute(period: str, minute_bucket: int) -> tuple[datetime, datetime]:
+    """Date range for a period ending at the start of the given minute"""
+    days = _PERIOD_DAYS.get(period)
+    if days is None:
         raise ValueError(f"Invalid period: {period}")
     
+    end_date = datetime.fromtimestamp(minute_bucket * 60)
+    start_date = end_date - timedelta(days=days)
     return start_date, end_date
 
 
-def calculate_progress_percentage(consumed: float, goal: float) -> float:
+def calculate_date_range(period: str) -> tuple[datetime, datetime]:
     """
-    Calculate progress percentage
+    Calculate date range based on period
+    
+    Requests within the same minute share one cached range; the end date is
+    truncated to the current minute.
     
     Args:
-        consumed: Amount consumed
-        goal: Goal amount
+        period: "week", "month", or "year"
         
     Returns:
-        Progress percentage (0-100+)
+        Tuple of (start_date, end_date)
     """
-    if goal <= 0:
-        return 0.0
-    
-    return round((consumed / goal) * 100, 1)
+    return _date_range_for_minute(period, int(time.time()) // 60)
+
+
+# Below this size a plain loop beats building an array
+_VECTORIZE_MIN_INGREDIENTS = 8
+_MACRO_KEYS = ('calories', 'protein', 'fats', 'carbs')
+_SUM_KEYS = _MACRO_KEYS + ('weight',)
 
 
 def calculate_macros_from_ingredients(ingredients: list) -> dict:
     """
-    Calculate total macros from list of ingredients
+    Calculate total macros and weight from list of ingredients
     
     Args:
         ingredients: List of ingredient dictionaries
         
     Returns:
-        Dictionary with total calories, protein, fats, carbs
+        Dictionary with total calories, protein, fats, carbs (rounded to
+        0.1) and weight
     """
-    total_calories = sum(ing.get('calories', 0) for ing in ingredients)
-    total_protein = sum(ing.get('protein', 0) for ing in ingredients)
-    total_fats = sum(ing.get('fats', 0) for ing in ingredients)
-    total_carbs = sum(ing.get('carbs', 0) for ing in ingredients)
-    
-    return {
-        'calories': round(total_calories, 1),
-        'protein': round(total_protein, 1),
-        'fats': round(total_fats, 1),
-        'carbs': round(total_carbs, 1)
-    }
+    if len(ingredients) < _VECTORIZE_MIN_INGREDIENTS:
+        totals = [0, 0, 0, 0, 0]
+        for ing in ingredients:
+            totals[0] += ing.get('calories', 0)
+            totals[1] += ing.get('protein', 0)
+            totals[2] += ing.get('fats', 0)
+            totals[3] += ing.get('carbs', 0)
+            totals[4] += ing.get('weight', 0)
+    else:
+        # One contiguous row per summed field (structure of arrays)
+        data = np.fromiter(
+            (ing.get(key, 0) for key in _SUM_KEYS for ing in ingredients),
+            dtype=np.float64,
+            count=len(_SUM_KEYS) * len(ingredients)
+        ).reshape(len(_SUM_KEYS), -1)
+        totals = data.sum(axis=1).tolist()
+    
+    result = {key: round(total, 1) for key, total in zip(_MACRO_KEYS, totals)}
+    result['weight'] = totals[4]
+    return result
 
 
 def validate_nutrition_data(calories: float, protein: float, fats: float, carbs: float) -> bool:
@@ -116,17 +153,10 @@ def validate_nutrition_data(calories: float, protein: float, fats: float, carbs:
     Returns:
         True if data is consistent, False otherwise
     """
-    # Calculate calories from macros (protein: 4 kcal/g, fats: 9 kcal/g, carbs: 4 kcal/g)
-    calculated_calories = (protein * 4) + (fats * 9) + (carbs * 4)
-    
-    # Allow 10% tolerance
-    tolerance = 0.10
-    lower_bound = calculated_calories * (1 - tolerance)
-    upper_bound = calculated_calories * (1 + tolerance)
-    
-    is_valid = lower_bound <= calories <= upper_bound
+    is_valid = bool(validate_nutrition_data_batch([[calories, protein, fats, carbs]])[0])
     
     if not is_valid:
+        calculated_calories = (protein * 4) + (fats * 9) + (carbs * 4)
         logger.warning(
             f"Nutrition data inconsistency: "
             f"Calories={calories}, Calculated={calculated_calories:.1f} "
@@ -136,6 +166,32 @@ def validate_nutrition_data(calories: float, protein: float, fats: float, carbs:
     return is_valid
 
 
+def validate_nutrition_data_batch(values: np.ndarray) -> np.ndarray:
+    """
+    Validate nutrition data consistency for many rows at once
+    
+    validate_nutrition_data is a one-row wrapper around this; the batch
+    form itself does no per-row logging.
+    
+    Args:
+        values: Array of shape (N, 4) with columns calories, protein, fats, carbs
+        
+    Returns:
+        Boolean array of shape (N,), True where the row is consistent
+    """
+    values = np.asarray(values, dtype=np.float64)
+    calories = values[:, 0]
+    # Calories from macros (protein: 4 kcal/g, fats: 9 kcal/g, carbs: 4 kcal/g)
+    calculated_calories = values[:, 1] * 4 + values[:, 2] * 9 + values[:, 3] * 4
+    
+    # Allow 10% tolerance
+    tolerance = 0.10
+    return (
+        (calculated_calories * (1 - tolerance) <= calories)
+        & (calories <= calculated_calories * (1 + tolerance))
+    )
+
+
 def format_date_for_db(date: Optional[datetime] = None) -> str:
     """
     Format date for database storage
@@ -152,10 +208,14 @@ def format_date_for_db(date: Optional[datetime] = None) -> str:
     return date.strftime("%Y-%m-%d")
 
 
+@lru_cache(maxsize=512)
 def parse_date_from_string(date_str: str) -> datetime:
     """
     Parse date from string
     
+    Results are cached: the same dates are requested repeatedly and
+    datetime objects are immutable.
+    
     Args:
         date_str: Date string in YYYY-MM-DD format
         
@@ -166,6 +226,13 @@ def parse_date_from_string(date_str: str) -> datetime:
         ValueError: If date format is invalid
     """
     try:
+        # Fast path for canonical YYYY-MM-DD, skipping strptime's regex machinery
+        if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+            year, month, day = date_str[:4], date_str[5:7], date_str[8:]
+            if year.isdigit() and month.isdigit() and day.isdigit():
+                return datetime(int(year), int(month), int(day))
+        
+        # Anything else (e.g. unpadded 2024-5-1) goes through strptime
         return datetime.strptime(date_str, "%Y-%m-%d")
     except ValueError:
         raise ValueError(f"Invalid date format: {date_str}. Expected YYYY-MM-DD")
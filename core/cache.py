@@ -0,0 +1,57 @@
+"""
+Small in-process TTL + LRU cache
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    Bounded mapping whose entries expire ttl seconds after being set
+
+    Backed by an OrderedDict kept in least-recently-used order, so reads
+    and writes are O(1) and the oldest entry is evicted when full.
+    Expired entries are dropped lazily when they are looked up.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the live value for key, or default"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= self.timer():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether key has a live entry (does not refresh its LRU position)"""
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self.timer()
+    
+    def __setitem__(self, key: Hashable, value: Any):
+        self._data[key] = (self.timer() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key and return its value (expired or not), or default"""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """Remove all entries"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
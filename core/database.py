@@ -2,14 +2,608 @@
 Database layer with async SQLite support
 """
 import aiosqlite
+import asyncio
 import logging
 import json
-from typing import Optional, Dict, Any, List
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Day view ordering: breakfast, lunch, dinner, snack, then anything else
+MEAL_TYPE_ORDER_SQL = """
+    CASE COALESCE(meal_type, 'snack')
+        WHEN 'breakfast' THEN 0
+        WHEN 'lunch' THEN 1
+        WHEN 'dinner' THEN 2
+        WHEN 'snack' THEN 3
+        ELSE 4
+    END"""
+
+# Hot per-request meal queries, kept as fixed strings so SQLite's
+# statement cache sees identical SQL text on every call
+_SELECT_MEAL_SQL = "SELECT * FROM meals WHERE meal_id = ?"
+_SELECT_USER_MEAL_SQL = "SELECT * FROM meals WHERE meal_id = ? AND user_id = ?"
+_MEAL_EXISTS_SQL = "SELECT 1 FROM meals WHERE meal_id = ?"
+_DELETE_MEAL_SQL = "DELETE FROM meals WHERE meal_id = ?"
+_DELETE_USER_MEAL_SQL = "DELETE FROM meals WHERE meal_id = ? AND user_id = ?"
+# Full meal row as a lightweight tuple for read-once listings
+MealRow = namedtuple("MealRow", (
+    "meal_id user_id session_id dish_name meal_type photo_file_id components "
+    "total_weight total_calories protein_g fat_g carbs_g health_score "
+    "confidence_avg corrections_count eaten_at"
+))
+_MEAL_ROW_COLUMNS = ", ".join(MealRow._fields)
+_MEAL_SUMMARY_COLUMNS = (
+    "meal_id, dish_name, meal_type, eaten_at, total_calories, protein_g, fat_g, carbs_g"
+)
+
+# Appends one correction to the session's JSON list in a single statement
+# (malformed legacy lists are restarted, as the Python path used to do)
+_APPEND_CORRECTION_SQL = """
+    UPDATE meal_sessions SET
+        corrections = json_insert(
+            CASE WHEN json_valid(corrections) THEN corrections ELSE '[]' END,
+            '$[#]', json(?)
+        ),
+        correction_count = json_array_length(
+            CASE WHEN json_valid(corrections) THEN corrections ELSE '[]' END
+        ) + 1,
+        corrected_analysis = ?
+    WHERE session_id = ?
+"""
+
+# Expired sessions are purged in bounded batches
+EXPIRED_SESSIONS_BATCH = 1000
+_DELETE_EXPIRED_SESSIONS_SQL = """
+    DELETE FROM meal_sessions WHERE rowid IN (
+        SELECT rowid FROM meal_sessions WHERE expires_at < ? LIMIT ?
+    )
+"""
+
+# Per-connection tuning applied when the shared connection is opened.
+# WAL lets readers run alongside a writer, and synchronous=NORMAL only
+# fsyncs at checkpoints instead of on every commit.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Read-only connections served alongside the writer (WAL allows one
+# writer plus any number of concurrent readers)
+READER_POOL_SIZE = 4
+_READER_PRAGMAS = (
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+# Full schema, run as a single executescript() transaction on startup
+_SCHEMA_SQL = """
+BEGIN;
+
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    current_state TEXT DEFAULT 'idle',
+
+    -- Goals
+    goal TEXT DEFAULT 'weight_loss',
+    target_weight REAL,
+    start_weight REAL,
+    current_weight REAL,
+    height INTEGER,
+    age INTEGER,
+    gender TEXT,
+
+    -- Calculated
+    daily_calories INTEGER,
+    protein_goal INTEGER,
+    fat_goal INTEGER,
+    carbs_goal INTEGER,
+
+    -- Settings
+    notifications_enabled BOOLEAN DEFAULT TRUE,
+    quiet_hours_start TIME DEFAULT '22:00',
+    quiet_hours_end TIME DEFAULT '07:00',
+    language TEXT DEFAULT 'ru',
+
+    -- Stats
+    streak_days INTEGER DEFAULT 0,
+    total_workouts INTEGER DEFAULT 0,
+    total_meals_logged INTEGER DEFAULT 0,
+
+    last_activity TIMESTAMP
+);
+
+-- Meal sessions table
+CREATE TABLE IF NOT EXISTS meal_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    photo_file_id TEXT,
+
+    -- Analysis stages (stored as JSON)
+    initial_analysis TEXT,
+    corrected_analysis TEXT,
+    final_analysis TEXT,
+    corrections TEXT,
+
+    -- Status
+    status TEXT DEFAULT 'pending',
+    correction_count INTEGER DEFAULT 0,
+    confirmed_at TIMESTAMP,
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Meals table
+CREATE TABLE IF NOT EXISTS meals (
+    meal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    session_id TEXT,
+
+    dish_name TEXT,
+    meal_type TEXT,
+    photo_file_id TEXT,
+    components TEXT,
+
+    total_weight INTEGER,
+    total_calories INTEGER,
+    protein_g INTEGER,
+    fat_g INTEGER,
+    carbs_g INTEGER,
+
+    health_score INTEGER,
+    confidence_avg REAL,
+    corrections_count INTEGER DEFAULT 0,
+
+    eaten_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id),
+    FOREIGN KEY (session_id) REFERENCES meal_sessions(session_id)
+);
+
+-- Food components view: per-ingredient rows read straight from the
+-- meals.components JSON (the meal row is the only copy of that data)
+CREATE VIEW IF NOT EXISTS v_meal_components AS
+SELECT
+    m.meal_id,
+    m.user_id,
+    json_extract(je.value, '$.name') AS name,
+    CAST(json_extract(je.value, '$.weight_g') AS INTEGER) AS weight_g,
+    CAST(json_extract(je.value, '$.calories') AS INTEGER) AS calories,
+    CAST(json_extract(je.value, '$.protein_g') AS INTEGER) AS protein_g,
+    CAST(json_extract(je.value, '$.fat_g') AS INTEGER) AS fat_g,
+    CAST(json_extract(je.value, '$.carbs_g') AS INTEGER) AS carbs_g,
+    json_extract(je.value, '$.confidence') AS confidence
+FROM meals m, json_each(m.components) je
+WHERE json_valid(m.components);
+
+-- Water logs table
+CREATE TABLE IF NOT EXISTS water_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount_ml INTEGER,
+    logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Workout plans table
+CREATE TABLE IF NOT EXISTS workout_plans (
+    plan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+
+    plan_name TEXT,
+    start_date DATE,
+    end_date DATE,
+    frequency_per_week INTEGER,
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Workouts table
+CREATE TABLE IF NOT EXISTS workouts (
+    workout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plan_id INTEGER,
+    user_id INTEGER NOT NULL,
+
+    workout_date DATE,
+    exercises TEXT,
+    duration_minutes INTEGER,
+    completed BOOLEAN DEFAULT FALSE,
+
+    FOREIGN KEY (plan_id) REFERENCES workout_plans(plan_id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Daily stats table
+CREATE TABLE IF NOT EXISTS daily_stats (
+    stat_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+
+    calories_consumed INTEGER DEFAULT 0,
+    protein_consumed INTEGER DEFAULT 0,
+    fat_consumed INTEGER DEFAULT 0,
+    carbs_consumed INTEGER DEFAULT 0,
+
+    water_ml INTEGER DEFAULT 0,
+    steps INTEGER DEFAULT 0,
+
+    meals_count INTEGER DEFAULT 0,
+    workouts_count INTEGER DEFAULT 0,
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id),
+    UNIQUE(user_id, date)
+);
+
+-- Contracts table
+CREATE TABLE IF NOT EXISTS contracts (
+    contract_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+
+    contract_type TEXT,
+    start_date DATE,
+    end_date DATE,
+    goal_description TEXT,
+
+    penalty_type TEXT,
+    penalty_details TEXT,
+    witness_username TEXT,
+
+    active BOOLEAN DEFAULT TRUE,
+    violations_count INTEGER DEFAULT 0,
+    last_violation DATE,
+
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Checkins table
+CREATE TABLE IF NOT EXISTS checkins (
+    checkin_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+
+    morning_mood INTEGER,
+    morning_goal TEXT,
+    morning_weight REAL,
+    morning_time TIMESTAMP,
+
+    evening_completed BOOLEAN,
+    evening_reflection TEXT,
+    evening_mood INTEGER,
+    evening_time TIMESTAMP,
+
+    checkin_date DATE,
+
+    UNIQUE(user_id, checkin_date),
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Weight history table
+CREATE TABLE IF NOT EXISTS weight_history (
+    record_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    weight REAL,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+-- Typical dishes table (for realistic comparison)
+CREATE TABLE IF NOT EXISTS typical_dishes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dish_name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    source TEXT,
+
+    -- Nutrition per 100g
+    calories_per_100g REAL NOT NULL,
+    protein_per_100g REAL NOT NULL,
+    fat_per_100g REAL NOT NULL,
+    carbs_per_100g REAL NOT NULL,
+
+    -- Additional metrics
+    sodium_per_100g REAL,
+    sugar_per_100g REAL,
+    saturated_fat_per_100g REAL,
+    fiber_per_100g REAL,
+
+    -- Typical portion
+    typical_weight_g INTEGER,
+    health_score INTEGER,
+
+    -- Metadata
+    description TEXT,
+    tags TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Repair counters that older versions stored as the literal text
+-- 'total_meals_logged + 1'
+UPDATE users
+SET total_meals_logged = (SELECT COUNT(*) FROM meals WHERE meals.user_id = users.user_id)
+WHERE typeof(total_meals_logged) = 'text';
+
+-- Indexes
+CREATE INDEX IF NOT EXISTS idx_users_state ON users(current_state);
+-- Covers the per-day nutrition sums; supersedes idx_meals_user_date
+DROP INDEX IF EXISTS idx_meals_user_date;
+CREATE INDEX IF NOT EXISTS idx_meals_user_totals
+    ON meals(user_id, eaten_at, total_calories, protein_g, fat_g, carbs_g);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_status ON meal_sessions(user_id, status);
+-- Only open sessions, pre-sorted for get_active_session
+CREATE INDEX IF NOT EXISTS idx_sessions_active
+    ON meal_sessions(user_id, created_at DESC) WHERE status != 'completed';
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON meal_sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON checkins(user_id, checkin_date);
+CREATE INDEX IF NOT EXISTS idx_weight_history_user ON weight_history(user_id, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_dishes_category ON typical_dishes(category);
+CREATE INDEX IF NOT EXISTS idx_dishes_name ON typical_dishes(dish_name);
+
+-- Daily rollup: daily_stats nutrition totals follow every meal write
+CREATE TRIGGER IF NOT EXISTS trg_meals_daily_stats_insert AFTER INSERT ON meals
+BEGIN
+    INSERT INTO daily_stats
+    (user_id, date, calories_consumed, protein_consumed, fat_consumed, carbs_consumed, meals_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(DATE(NEW.eaten_at), DATE('now', 'localtime')),
+        COALESCE(NEW.total_calories, 0),
+        COALESCE(NEW.protein_g, 0),
+        COALESCE(NEW.fat_g, 0),
+        COALESCE(NEW.carbs_g, 0),
+        1
+    )
+    ON CONFLICT(user_id, date) DO UPDATE SET
+        calories_consumed = calories_consumed + excluded.calories_consumed,
+        protein_consumed = protein_consumed + excluded.protein_consumed,
+        fat_consumed = fat_consumed + excluded.fat_consumed,
+        carbs_consumed = carbs_consumed + excluded.carbs_consumed,
+        meals_count = meals_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_meals_daily_stats_delete AFTER DELETE ON meals
+BEGIN
+    UPDATE daily_stats SET
+        calories_consumed = calories_consumed - COALESCE(OLD.total_calories, 0),
+        protein_consumed = protein_consumed - COALESCE(OLD.protein_g, 0),
+        fat_consumed = fat_consumed - COALESCE(OLD.fat_g, 0),
+        carbs_consumed = carbs_consumed - COALESCE(OLD.carbs_g, 0),
+        meals_count = meals_count - 1
+    WHERE user_id = OLD.user_id
+      AND date = COALESCE(DATE(OLD.eaten_at), DATE('now', 'localtime'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_meals_daily_stats_update
+AFTER UPDATE OF user_id, eaten_at, total_calories, protein_g, fat_g, carbs_g ON meals
+BEGIN
+    UPDATE daily_stats SET
+        calories_consumed = calories_consumed - COALESCE(OLD.total_calories, 0),
+        protein_consumed = protein_consumed - COALESCE(OLD.protein_g, 0),
+        fat_consumed = fat_consumed - COALESCE(OLD.fat_g, 0),
+        carbs_consumed = carbs_consumed - COALESCE(OLD.carbs_g, 0),
+        meals_count = meals_count - 1
+    WHERE user_id = OLD.user_id
+      AND date = COALESCE(DATE(OLD.eaten_at), DATE('now', 'localtime'));
+    INSERT INTO daily_stats
+    (user_id, date, calories_consumed, protein_consumed, fat_consumed, carbs_consumed, meals_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(DATE(NEW.eaten_at), DATE('now', 'localtime')),
+        COALESCE(NEW.total_calories, 0),
+        COALESCE(NEW.protein_g, 0),
+        COALESCE(NEW.fat_g, 0),
+        COALESCE(NEW.carbs_g, 0),
+        1
+    )
+    ON CONFLICT(user_id, date) DO UPDATE SET
+        calories_consumed = calories_consumed + excluded.calories_consumed,
+        protein_consumed = protein_consumed + excluded.protein_consumed,
+        fat_consumed = fat_consumed + excluded.fat_consumed,
+        carbs_consumed = carbs_consumed + excluded.carbs_consumed,
+        meals_count = meals_count + 1;
+END;
+
+-- Full-text index over the dish catalogue (external content, kept in sync
+-- by triggers; filled from existing rows once, in _MIGRATIONS)
+CREATE VIRTUAL TABLE IF NOT EXISTS typical_dishes_fts USING fts5(
+    dish_name, description, tags,
+    content='typical_dishes', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_typical_dishes_fts_insert AFTER INSERT ON typical_dishes
+BEGIN
+    INSERT INTO typical_dishes_fts (rowid, dish_name, description, tags)
+    VALUES (NEW.id, NEW.dish_name, NEW.description, NEW.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_typical_dishes_fts_delete AFTER DELETE ON typical_dishes
+BEGIN
+    INSERT INTO typical_dishes_fts (typical_dishes_fts, rowid, dish_name, description, tags)
+    VALUES ('delete', OLD.id, OLD.dish_name, OLD.description, OLD.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_typical_dishes_fts_update AFTER UPDATE ON typical_dishes
+BEGIN
+    INSERT INTO typical_dishes_fts (typical_dishes_fts, rowid, dish_name, description, tags)
+    VALUES ('delete', OLD.id, OLD.dish_name, OLD.description, OLD.tags);
+    INSERT INTO typical_dishes_fts (rowid, dish_name, description, tags)
+    VALUES (NEW.id, NEW.dish_name, NEW.description, NEW.tags);
+END;
+
+COMMIT;
+"""
+
+# Keys returned by Database.get_daily_totals
+_DAILY_TOTALS_KEYS = ('meals_count', 'total_calories', 'protein_g', 'fat_g', 'carbs_g')
+
+# One-time data migrations, applied in order after _SCHEMA_SQL. PRAGMA
+# user_version records how many have run, so each runs once per database.
+_MIGRATIONS = (
+    # 1: daily_stats nutrition columns are trigger-maintained from here on;
+    # seed them from the meals logged before the triggers existed
+    """
+    INSERT INTO daily_stats
+    (user_id, date, calories_consumed, protein_consumed, fat_consumed, carbs_consumed, meals_count)
+    SELECT user_id,
+           COALESCE(DATE(eaten_at), DATE('now', 'localtime')) AS day,
+           COALESCE(SUM(total_calories), 0),
+           COALESCE(SUM(protein_g), 0),
+           COALESCE(SUM(fat_g), 0),
+           COALESCE(SUM(carbs_g), 0),
+           COUNT(*)
+    FROM meals
+    WHERE true
+    GROUP BY user_id, day
+    ON CONFLICT(user_id, date) DO UPDATE SET
+        calories_consumed = excluded.calories_consumed,
+        protein_consumed = excluded.protein_consumed,
+        fat_consumed = excluded.fat_consumed,
+        carbs_consumed = excluded.carbs_consumed,
+        meals_count = excluded.meals_count;
+    """,
+    # 2: index dishes added before typical_dishes_fts and its triggers existed
+    """
+    INSERT INTO typical_dishes_fts (typical_dishes_fts) VALUES ('rebuild');
+    """,
+)
+
+_INSERT_TYPICAL_DISH_SQL = """
+    INSERT INTO typical_dishes
+    (dish_name, category, source, calories_per_100g, protein_per_100g,
+     fat_per_100g, carbs_per_100g, sodium_per_100g, sugar_per_100g,
+     saturated_fat_per_100g, fiber_per_100g, typical_weight_g,
+     health_score, description, tags)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _typical_dish_params(dish_data: Dict[str, Any]) -> tuple:
+    """Bind parameters for _INSERT_TYPICAL_DISH_SQL"""
+    return (
+        dish_data['dish_name'],
+        dish_data['category'],
+        dish_data.get('source'),
+        dish_data['calories_per_100g'],
+        dish_data['protein_per_100g'],
+        dish_data['fat_per_100g'],
+        dish_data['carbs_per_100g'],
+        dish_data.get('sodium_per_100g'),
+        dish_data.get('sugar_per_100g'),
+        dish_data.get('saturated_fat_per_100g'),
+        dish_data.get('fiber_per_100g'),
+        dish_data.get('typical_weight_g'),
+        dish_data['health_score'],
+        dish_data.get('description'),
+        _dumps(dish_data.get('tags', []))
+    )
+
+
+def _dumps(value: Any) -> str:
+    """Compact JSON for TEXT columns (no padding whitespace, UTF-8 kept as is)"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+# Columns the generic update_* methods may set. Column names are spliced
+# into SQL text, so anything outside these sets is rejected.
+_UPDATABLE_COLUMNS = {
+    'users': frozenset({
+        'username', 'first_name', 'last_name', 'current_state',
+        'goal', 'target_weight', 'start_weight', 'current_weight',
+        'height', 'age', 'gender',
+        'daily_calories', 'protein_goal', 'fat_goal', 'carbs_goal',
+        'notifications_enabled', 'quiet_hours_start', 'quiet_hours_end', 'language',
+        'streak_days', 'total_workouts', 'total_meals_logged', 'last_activity',
+    }),
+    'meal_sessions': frozenset({
+        'photo_file_id', 'initial_analysis', 'corrected_analysis', 'final_analysis',
+        'corrections', 'status', 'correction_count', 'confirmed_at', 'expires_at',
+    }),
+    'meals': frozenset({
+        'session_id', 'dish_name', 'meal_type', 'photo_file_id', 'components',
+        'total_weight', 'total_calories', 'protein_g', 'fat_g', 'carbs_g',
+        'health_score', 'confidence_avg', 'corrections_count', 'eaten_at',
+    }),
+    'daily_stats': frozenset({
+        'calories_consumed', 'protein_consumed', 'fat_consumed', 'carbs_consumed',
+        'meals_count', 'water_ml', 'steps', 'workouts_count',
+    }),
+}
+
+
+def _check_columns(table: str, columns: tuple):
+    """Raise ValueError for columns that may not be updated on table"""
+    unknown = set(columns) - _UPDATABLE_COLUMNS[table]
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+
+
+# users counters that may be bumped in place with increment_user
+_USER_COUNTERS = frozenset({'total_meals_logged', 'total_workouts', 'streak_days'})
+
+
+@lru_cache(maxsize=8)
+def _increment_user_sql(field: str) -> str:
+    """Build the atomic counter UPDATE for a users counter column"""
+    if field not in _USER_COUNTERS:
+        raise ValueError(f"Unknown users counter: {field}")
+    return f"UPDATE users SET {field} = {field} + ? WHERE user_id = ?"
+
+
+@lru_cache(maxsize=32)
+def _transition_user_state_sql(source_count: int) -> str:
+    """Build the conditional state UPDATE for a given number of source states"""
+    placeholders = ", ".join("?" * source_count)
+    return f"""
+        UPDATE users SET current_state = ?, last_activity = ?
+        WHERE user_id = ? AND COALESCE(current_state, 'idle') IN ({placeholders})
+    """
+
+
+@lru_cache(maxsize=256)
+def _update_sql(table: str, columns: tuple, where: str) -> str:
+    """Build (once per column set) an UPDATE statement for table"""
+    _check_columns(table, columns)
+    fields = ", ".join(f"{column} = ?" for column in columns)
+    return f"UPDATE {table} SET {fields} WHERE {where}"
+
+
+@lru_cache(maxsize=64)
+def _upsert_daily_stats_sql(columns: tuple) -> str:
+    """Build (once per column set) the upsert used by update_daily_stats"""
+    _check_columns('daily_stats', columns)
+    return f"""
+        INSERT INTO daily_stats (user_id, date, {', '.join(columns)})
+        VALUES (?, ?, {', '.join('?' * len(columns))})
+        ON CONFLICT(user_id, date) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in columns)}
+    """
+
 
 class Database:
     """Async database wrapper for SQLite"""
@@ -17,311 +611,109 @@ class Database:
     def __init__(self, db_path: str = "data/database.db"):
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    
-    async def initialize(self):
-        """Initialize database with all tables"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await self._create_tables(db)
-            await self._create_indexes(db)
-            await db.commit()
-        logger.info("Database initialized successfully")
-    
-    async def _create_tables(self, db: aiosqlite.Connection):
-        """Create all tables"""
-        
-        # Users table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                current_state TEXT DEFAULT 'idle',
-                
-                -- Goals
-                goal TEXT DEFAULT 'weight_loss',
-                target_weight REAL,
-                start_weight REAL,
-                current_weight REAL,
-                height INTEGER,
-                age INTEGER,
-                gender TEXT,
-                
-                -- Calculated
-                daily_calories INTEGER,
-                protein_goal INTEGER,
-                fat_goal INTEGER,
-                carbs_goal INTEGER,
-                
-                -- Settings
-                notifications_enabled BOOLEAN DEFAULT TRUE,
-                quiet_hours_start TIME DEFAULT '22:00',
-                quiet_hours_end TIME DEFAULT '07:00',
-                language TEXT DEFAULT 'ru',
-                
-                -- Stats
-                streak_days INTEGER DEFAULT 0,
-                total_workouts INTEGER DEFAULT 0,
-                total_meals_logged INTEGER DEFAULT 0,
-                
-                last_activity TIMESTAMP
-            )
-        """)
-        
-        # Meal sessions table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS meal_sessions (
-                session_id TEXT PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                photo_file_id TEXT,
-                
-                -- Analysis stages (stored as JSON)
-                initial_analysis TEXT,
-                corrected_analysis TEXT,
-                final_analysis TEXT,
-                corrections TEXT,
-                
-                -- Status
-                status TEXT DEFAULT 'pending',
-                correction_count INTEGER DEFAULT 0,
-                confirmed_at TIMESTAMP,
-                
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Meals table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS meals (
-                meal_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                session_id TEXT,
-                
-                dish_name TEXT,
-                meal_type TEXT,
-                photo_file_id TEXT,
-                components TEXT,
-                
-                total_weight INTEGER,
-                total_calories INTEGER,
-                protein_g INTEGER,
-                fat_g INTEGER,
-                carbs_g INTEGER,
-                
-                health_score INTEGER,
-                confidence_avg REAL,
-                corrections_count INTEGER DEFAULT 0,
-                
-                eaten_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id),
-                FOREIGN KEY (session_id) REFERENCES meal_sessions(session_id)
-            )
-        """)
-        
-        # Food components table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS food_components (
-                component_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                meal_id INTEGER NOT NULL,
-                
-                name TEXT NOT NULL,
-                weight_g INTEGER,
-                calories INTEGER,
-                protein_g INTEGER,
-                fat_g INTEGER,
-                carbs_g INTEGER,
-                confidence REAL,
-                
-                FOREIGN KEY (meal_id) REFERENCES meals(meal_id)
-            )
-        """)
-        
-        # Water logs table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS water_logs (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                amount_ml INTEGER,
-                logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Workout plans table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS workout_plans (
-                plan_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                
-                plan_name TEXT,
-                start_date DATE,
-                end_date DATE,
-                frequency_per_week INTEGER,
-                
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Workouts table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS workouts (
-                workout_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                plan_id INTEGER,
-                user_id INTEGER NOT NULL,
-                
-                workout_date DATE,
-                exercises TEXT,
-                duration_minutes INTEGER,
-                completed BOOLEAN DEFAULT FALSE,
-                
-                FOREIGN KEY (plan_id) REFERENCES workout_plans(plan_id),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Daily stats table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS daily_stats (
-                stat_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date DATE NOT NULL,
-                
-                calories_consumed INTEGER DEFAULT 0,
-                protein_consumed INTEGER DEFAULT 0,
-                fat_consumed INTEGER DEFAULT 0,
-                carbs_consumed INTEGER DEFAULT 0,
-                
-                water_ml INTEGER DEFAULT 0,
-                steps INTEGER DEFAULT 0,
-                
-                meals_count INTEGER DEFAULT 0,
-                workouts_count INTEGER DEFAULT 0,
-                
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id),
-                UNIQUE(user_id, date)
-            )
-        """)
         
-        # Contracts table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS contracts (
-                contract_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                
-                contract_type TEXT,
-                start_date DATE,
-                end_date DATE,
-                goal_description TEXT,
-                
-                penalty_type TEXT,
-                penalty_details TEXT,
-                witness_username TEXT,
-                
-                active BOOLEAN DEFAULT TRUE,
-                violations_count INTEGER DEFAULT 0,
-                last_violation DATE,
-                
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
+        # One long-lived read/write connection (opened lazily)
+        self._db: Optional[aiosqlite.Connection] = None
+        # Pool of read-only connections, filled on first read
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[aiosqlite.Connection] = []
+        self._connect_lock = asyncio.Lock()
+        # Serializes write transactions on the shared connection
+        self._write_lock = asyncio.Lock()
         
-        # Checkins table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS checkins (
-                checkin_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                
-                morning_mood INTEGER,
-                morning_goal TEXT,
-                morning_weight REAL,
-                morning_time TIMESTAMP,
-                
-                evening_completed BOOLEAN,
-                evening_reflection TEXT,
-                evening_mood INTEGER,
-                evening_time TIMESTAMP,
-                
-                checkin_date DATE,
-                
-                UNIQUE(user_id, checkin_date),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Weight history table
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS weight_history (
-                record_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                weight REAL,
-                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Typical dishes table (for realistic comparison)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS typical_dishes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                dish_name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                source TEXT,
-                
-                -- Nutrition per 100g
-                calories_per_100g REAL NOT NULL,
-                protein_per_100g REAL NOT NULL,
-                fat_per_100g REAL NOT NULL,
-                carbs_per_100g REAL NOT NULL,
-                
-                -- Additional metrics
-                sodium_per_100g REAL,
-                sugar_per_100g REAL,
-                saturated_fat_per_100g REAL,
-                fiber_per_100g REAL,
-                
-                -- Typical portion
-                typical_weight_g INTEGER,
-                health_score INTEGER,
-                
-                -- Metadata
-                description TEXT,
-                tags TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        # typical_dishes is reference data: cached in memory after the
+        # first read, grouped by category, dropped on every insert
+        self._dishes_cache: Optional[Dict[Optional[str], List[Dict[str, Any]]]] = None
+        self._dishes_generation = 0
+        self._dishes_lock = asyncio.Lock()
+    
+    async def _connection(self) -> aiosqlite.Connection:
+        """Get the read/write connection, opening it on first use"""
+        if self._db is None:
+            async with self._connect_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_path)
+                    db.row_factory = aiosqlite.Row
+                    for pragma in _CONNECTION_PRAGMAS:
+                        await db.execute(pragma)
+                    self._db = db
+        return self._db
+    
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Run a write on the shared connection
         
-        logger.info("All tables created")
+        Writes are serialized so one caller's commit never includes another
+        caller's half-done statements. Commits on success, rolls back on error.
+        """
+        db = await self._connection()
+        async with self._write_lock:
+            try:
+                yield db
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+    
+    async def _open_readers(self):
+        """Open the read-only connection pool"""
+        # The writer must exist first so WAL mode is already set on the file
+        await self._connection()
+        async with self._connect_lock:
+            if self._readers is not None:
+                return
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            readers = asyncio.Queue()
+            for _ in range(READER_POOL_SIZE):
+                db = await aiosqlite.connect(uri, uri=True)
+                db.row_factory = aiosqlite.Row
+                for pragma in _READER_PRAGMAS:
+                    await db.execute(pragma)
+                self._reader_connections.append(db)
+                readers.put_nowait(db)
+            self._readers = readers
+    
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        if self._readers is None:
+            await self._open_readers()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+    
+    async def close(self):
+        """Close the read/write connection and the reader pool"""
+        for db in self._reader_connections:
+            await db.close()
+        self._reader_connections = []
+        self._readers = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
     
-    async def _create_indexes(self, db: aiosqlite.Connection):
-        """Create indexes for performance"""
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_state ON users(current_state)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_meals_user_date ON meals(user_id, eaten_at)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_status ON meal_sessions(user_id, status)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON checkins(user_id, checkin_date)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_weight_history_user ON weight_history(user_id, recorded_at)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_dishes_category ON typical_dishes(category)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_dishes_name ON typical_dishes(dish_name)")
-        logger.info("Indexes created")
+    async def initialize(self):
+        """Initialize database with all tables"""
+        db = await self._connection()
+        async with self._write_lock:
+            await db.executescript(_SCHEMA_SQL)
+            async with db.execute("PRAGMA user_version") as cursor:
+                (version,) = await cursor.fetchone()
+            for target, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+                await db.executescript(
+                    f"BEGIN;\n{migration}\nPRAGMA user_version = {target};\nCOMMIT;"
+                )
+                logger.info(f"Database migrated to version {target}")
+        logger.info("Database initialized successfully")
     
     # ==================== USER METHODS ====================
     
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader() as db:
             async with db.execute(
                 "SELECT * FROM users WHERE user_id = ?",
                 (user_id,)
@@ -333,12 +725,11 @@ class Database:
                          first_name: str = None, last_name: str = None) -> bool:
         """Create new user"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._transaction() as db:
                 await db.execute("""
                     INSERT INTO users (user_id, username, first_name, last_name)
                     VALUES (?, ?, ?, ?)
                 """, (user_id, username, first_name, last_name))
-                await db.commit()
             logger.info(f"User {user_id} created")
             return True
         except aiosqlite.IntegrityError:
@@ -350,15 +741,11 @@ class Database:
         if not kwargs:
             return False
         
-        fields = ", ".join(f"{k} = ?" for k in kwargs.keys())
+        query = _update_sql('users', tuple(kwargs), "user_id = ?")
         values = list(kwargs.values()) + [user_id]
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                f"UPDATE users SET {fields} WHERE user_id = ?",
-                values
-            )
-            await db.commit()
+        async with self._transaction() as db:
+            await db.execute(query, values)
         
         logger.info(f"User {user_id} updated: {kwargs.keys()}")
         return True
@@ -367,28 +754,47 @@ class Database:
         """Update user state"""
         await self.update_user(user_id, current_state=state, last_activity=datetime.now())
     
+    async def transition_user_state(self, user_id: int, state: str,
+                                    from_states: tuple) -> bool:
+        """
+        Move user to state only if their current state is one of from_states
+        
+        The check and the write happen in a single UPDATE, so no prior
+        SELECT is needed to validate the transition.
+        
+        Returns:
+            True if the user existed and the transition was allowed
+        """
+        if not from_states:
+            return False
+        query = _transition_user_state_sql(len(from_states))
+        async with self._transaction() as db:
+            cursor = await db.execute(
+                query, (state, datetime.now(), user_id, *from_states)
+            )
+            return cursor.rowcount > 0
+    
     # ==================== SESSION METHODS ====================
     
     async def create_session(self, session_id: str, user_id: int, 
-                            photo_file_id: str, expires_in_minutes: int = 30) -> bool:
+                            photo_file_id: str, expires_in_minutes: int = 30,
+                            now: Optional[datetime] = None) -> bool:
         """Create new meal session"""
-        expires_at = datetime.now() + timedelta(minutes=expires_in_minutes)
+        expires_at = (now or datetime.now()) + timedelta(minutes=expires_in_minutes)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._transaction() as db:
             await db.execute("""
                 INSERT INTO meal_sessions 
                 (session_id, user_id, photo_file_id, expires_at)
                 VALUES (?, ?, ?, ?)
             """, (session_id, user_id, photo_file_id, expires_at))
-            await db.commit()
         
         logger.info(f"Session {session_id} created for user {user_id}")
         return True
     
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader() as db:
             async with db.execute(
                 "SELECT * FROM meal_sessions WHERE session_id = ?",
                 (session_id,)
@@ -407,8 +813,7 @@ class Database:
     
     async def get_active_session(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get active session for user"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader() as db:
             async with db.execute("""
                 SELECT * FROM meal_sessions 
                 WHERE user_id = ? AND status != 'completed' AND expires_at > ?
@@ -434,30 +839,53 @@ class Database:
         # Convert dict/list fields to JSON
         for key in ['initial_analysis', 'corrected_analysis', 'final_analysis', 'corrections']:
             if key in kwargs and kwargs[key] is not None:
-                kwargs[key] = json.dumps(kwargs[key], ensure_ascii=False)
+                kwargs[key] = _dumps(kwargs[key])
         
-        fields = ", ".join(f"{k} = ?" for k in kwargs.keys())
+        query = _update_sql('meal_sessions', tuple(kwargs), "session_id = ?")
         values = list(kwargs.values()) + [session_id]
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                f"UPDATE meal_sessions SET {fields} WHERE session_id = ?",
-                values
-            )
-            await db.commit()
+        async with self._transaction() as db:
+            await db.execute(query, values)
         
         logger.info(f"Session {session_id} updated")
         return True
     
-    async def delete_expired_sessions(self) -> int:
-        """Delete expired sessions"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def append_correction(self, session_id: str, entry_json: str,
+                                corrected_analysis: Dict[str, Any]) -> bool:
+        """
+        Append a correction and store the corrected analysis atomically
+        
+        Args:
+            session_id: Session ID
+            entry_json: The new correction entry, already JSON-encoded
+            corrected_analysis: Analysis after applying the correction
+        
+        Returns:
+            True if the session exists
+        """
+        async with self._transaction() as db:
             cursor = await db.execute(
-                "DELETE FROM meal_sessions WHERE expires_at < ?",
-                (datetime.now(),)
+                _APPEND_CORRECTION_SQL,
+                (entry_json, _dumps(corrected_analysis), session_id)
             )
-            await db.commit()
-            deleted = cursor.rowcount
+            return cursor.rowcount > 0
+    
+    async def delete_expired_sessions(self) -> int:
+        """
+        Delete expired sessions
+        
+        Rows are removed in batches of EXPIRED_SESSIONS_BATCH, each in its own
+        transaction, so other writers are never held up for a whole purge.
+        """
+        now = datetime.now()
+        deleted = 0
+        while True:
+            async with self._transaction() as db:
+                cursor = await db.execute(_DELETE_EXPIRED_SESSIONS_SQL, (now, EXPIRED_SESSIONS_BATCH))
+                batch = cursor.rowcount
+            deleted += batch
+            if batch < EXPIRED_SESSIONS_BATCH:
+                break
         
         if deleted > 0:
             logger.info(f"Deleted {deleted} expired sessions")
@@ -470,41 +898,78 @@ class Database:
                          fat_g: int, carbs_g: int,
                          meal_type: str = None) -> int:
         """Create meal record"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._transaction() as db:
             cursor = await db.execute("""
                 INSERT INTO meals 
-                (user_id, session_id, meal_type, total_calories, protein_g, fat_g, carbs_g)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, session_id, meal_type, total_calories, protein_g, fat_g, carbs_g))
-            await db.commit()
+                (user_id, session_id, meal_type, total_calories, protein_g, fat_g, carbs_g, eaten_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, session_id, meal_type, total_calories, protein_g, fat_g, carbs_g,
+                  datetime.now()))
             meal_id = cursor.lastrowid
-        
-        # Update user stats
-        await self.update_user(user_id, total_meals_logged=f"total_meals_logged + 1")
+            
+            # Update user stats in the same transaction
+            await db.execute(_increment_user_sql('total_meals_logged'), (1, user_id))
         
         logger.info(f"Meal {meal_id} created for user {user_id}")
         return meal_id
     
     async def get_meals_today(self, user_id: int) -> List[Dict[str, Any]]:
-        """Get today's meals for user"""
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
+        """Get today's meals for user, ordered by meal type"""
+        # Local midnight is computed by SQLite; a plain range on eaten_at
+        # keeps the idx_meals_user_totals index usable
+        async with self._reader() as db:
+            async with db.execute(f"""
                 SELECT * FROM meals 
-                WHERE user_id = ? AND eaten_at >= ?
-                ORDER BY eaten_at DESC
-            """, (user_id, today_start)) as cursor:
+                WHERE user_id = ? AND eaten_at >= datetime('now', 'localtime', 'start of day')
+                ORDER BY {MEAL_TYPE_ORDER_SQL}, eaten_at DESC
+            """, (user_id,)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
     
-    async def get_meals_history(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get meal history for user"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("""
+    async def get_meals_by_date(self, user_id: int, day: datetime.date) -> List[Dict[str, Any]]:
+        """Get meals for user on a specific day, ordered by meal type"""
+        day_start = datetime(day.year, day.month, day.day)
+        day_end = day_start + timedelta(days=1)
+        
+        # Range on eaten_at keeps the idx_meals_user_totals index usable
+        async with self._reader() as db:
+            async with db.execute(f"""
                 SELECT * FROM meals 
+                WHERE user_id = ? AND eaten_at >= ? AND eaten_at < ?
+                ORDER BY {MEAL_TYPE_ORDER_SQL}, eaten_at DESC
+            """, (user_id, day_start, day_end)) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+    
+    async def get_meals_history(self, user_id: int, limit: int = 10) -> List[MealRow]:
+        """
+        Get meal history for user
+        
+        Returns:
+            MealRow tuples, newest first (use ._asdict() where a dict is needed)
+        """
+        async with self._reader() as db:
+            async with db.execute(f"""
+                SELECT {_MEAL_ROW_COLUMNS} FROM meals 
+                WHERE user_id = ?
+                ORDER BY eaten_at DESC
+                LIMIT ?
+            """, (user_id, limit)) as cursor:
+                # Plain tuples from sqlite3, no per-row sqlite3.Row objects
+                cursor.row_factory = None
+                rows = await cursor.fetchall()
+                return list(map(MealRow._make, rows))
+    
+    async def get_meals_history_summary(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get meal history for user with only the columns needed for listing
+        
+        Skips the components JSON and other detail columns; use
+        get_meal_by_id for a full meal.
+        """
+        async with self._reader() as db:
+            async with db.execute(f"""
+                SELECT {_MEAL_SUMMARY_COLUMNS} FROM meals 
                 WHERE user_id = ?
                 ORDER BY eaten_at DESC
                 LIMIT ?
@@ -513,29 +978,55 @@ class Database:
                 return [dict(row) for row in rows]
     
     async def get_daily_calories(self, user_id: int) -> int:
-        """Get total calories consumed today"""
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        """Get total calories consumed today (from the daily_stats rollup)"""
+        async with self._reader() as db:
+            async with db.execute("""
+                SELECT calories_consumed FROM daily_stats
+                WHERE user_id = ? AND date = DATE('now', 'localtime')
+            """, (user_id,)) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row and row[0] else 0
+    
+    async def get_daily_totals(self, user_id: int, day: datetime.date = None) -> Dict[str, Any]:
+        """
+        Get aggregated nutrition for user on a day (today by default)
         
-        async with aiosqlite.connect(self.db_path) as db:
+        Read from the daily_stats rollup, like get_daily_calories.
+        
+        Returns:
+            Dictionary with meals_count, total_calories, protein_g, fat_g, carbs_g
+        """
+        if day is None:
+            day = datetime.now()
+        
+        async with self._reader() as db:
             async with db.execute("""
-                SELECT SUM(total_calories) as total
-                FROM meals 
-                WHERE user_id = ? AND eaten_at >= ?
-            """, (user_id, today_start)) as cursor:
+                SELECT meals_count,
+                       calories_consumed AS total_calories,
+                       protein_consumed AS protein_g,
+                       fat_consumed AS fat_g,
+                       carbs_consumed AS carbs_g
+                FROM daily_stats
+                WHERE user_id = ? AND date = ?
+            """, (user_id, day.strftime("%Y-%m-%d"))) as cursor:
                 row = await cursor.fetchone()
-                return row[0] if row[0] else 0
+        if row is None:
+            return dict.fromkeys(_DAILY_TOTALS_KEYS, 0)
+        return {key: value or 0 for key, value in zip(_DAILY_TOTALS_KEYS, row)}
     
     async def save_meal(self, meal_data: Dict[str, Any]) -> int:
         """
         Save complete meal with all details
         
         Args:
-            meal_data: Dictionary with meal information
+            meal_data: Dictionary with meal information; 'components' is a
+                list of component dicts and is JSON-encoded here.
+                daily_stats for the meal's day is updated by trigger.
         
         Returns:
             meal_id of saved meal
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._transaction() as db:
             cursor = await db.execute("""
                 INSERT INTO meals 
                 (user_id, session_id, dish_name, meal_type, photo_file_id,
@@ -548,7 +1039,7 @@ class Database:
                 meal_data['dish_name'],
                 meal_data['meal_type'],
                 meal_data['photo_file_id'],
-                json.dumps(meal_data['components'], ensure_ascii=False),
+                _dumps(meal_data['components']),
                 meal_data['total_weight'],
                 meal_data['total_calories'],
                 meal_data['protein_g'],
@@ -559,14 +1050,10 @@ class Database:
                 meal_data['corrections_count'],
                 meal_data['eaten_at']
             ))
-            await db.commit()
             meal_id = cursor.lastrowid
-        
-        # Update user stats
-        await self.update_user(
-            meal_data['user_id'],
-            total_meals_logged=f"total_meals_logged + 1"
-        )
+            
+            # Update user stats in the same transaction
+            await db.execute(_increment_user_sql('total_meals_logged'), (1, meal_data['user_id']))
         
         logger.info(f"Meal {meal_id} saved for user {meal_data['user_id']}")
         return meal_id
@@ -575,8 +1062,7 @@ class Database:
     
     async def get_daily_stats(self, user_id: int, date: datetime.date) -> Optional[Dict[str, Any]]:
         """Get daily statistics for specific date"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._reader() as db:
             async with db.execute("""
                 SELECT * FROM daily_stats
                 WHERE user_id = ? AND date = ?
@@ -584,84 +1070,35 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
     
-    async def create_daily_stats(
-        self,
-        user_id: int,
-        date: datetime.date,
-        calories_consumed: int = 0,
-        protein_consumed: int = 0,
-        fat_consumed: int = 0,
-        carbs_consumed: int = 0,
-        meals_count: int = 0
-    ) -> bool:
-        """Create daily statistics record"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO daily_stats
-                (user_id, date, calories_consumed, protein_consumed, 
-                 fat_consumed, carbs_consumed, meals_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, date, calories_consumed, protein_consumed,
-                  fat_consumed, carbs_consumed, meals_count))
-            await db.commit()
-        
-        logger.info(f"Daily stats created for user {user_id} on {date}")
-        return True
-    
     async def update_daily_stats(
         self,
         user_id: int,
         date: datetime.date,
-        calories_consumed: int = None,
-        protein_consumed: int = None,
-        fat_consumed: int = None,
-        carbs_consumed: int = None,
-        meals_count: int = None,
         water_ml: int = None,
         steps: int = None,
         workouts_count: int = None
     ) -> bool:
-        """Update daily statistics"""
-        updates = []
-        params = []
-        
-        if calories_consumed is not None:
-            updates.append("calories_consumed = ?")
-            params.append(calories_consumed)
-        if protein_consumed is not None:
-            updates.append("protein_consumed = ?")
-            params.append(protein_consumed)
-        if fat_consumed is not None:
-            updates.append("fat_consumed = ?")
-            params.append(fat_consumed)
-        if carbs_consumed is not None:
-            updates.append("carbs_consumed = ?")
-            params.append(carbs_consumed)
-        if meals_count is not None:
-            updates.append("meals_count = ?")
-            params.append(meals_count)
-        if water_ml is not None:
-            updates.append("water_ml = ?")
-            params.append(water_ml)
-        if steps is not None:
-            updates.append("steps = ?")
-            params.append(steps)
-        if workouts_count is not None:
-            updates.append("workouts_count = ?")
-            params.append(workouts_count)
-        
-        if not updates:
+        """
+        Set daily statistics, creating the day's row if it does not exist
+        
+        Only the given (non-None) columns are written; the rest keep their
+        current values or defaults. Nutrition totals and meals_count are
+        maintained by the meals triggers and cannot be set here.
+        """
+        values = {
+            'water_ml': water_ml,
+            'steps': steps,
+            'workouts_count': workouts_count,
+        }
+        columns = [column for column, value in values.items() if value is not None]
+        
+        if not columns:
             return False
         
-        params.extend([user_id, date])
+        params = [user_id, date] + [values[column] for column in columns]
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(f"""
-                UPDATE daily_stats
-                SET {', '.join(updates)}
-                WHERE user_id = ? AND date = ?
-            """, params)
-            await db.commit()
+        async with self._transaction() as db:
+            await db.execute(_upsert_daily_stats_sql(tuple(columns)), params)
         
         logger.info(f"Daily stats updated for user {user_id} on {date}")
         return True
@@ -669,117 +1106,176 @@ class Database:
     # ==================== UTILITY METHODS ====================
     
     async def cleanup(self):
-        """Cleanup expired data"""
+        """Cleanup expired data and refresh query planner statistics"""
         deleted = await self.delete_expired_sessions()
+        db = await self._connection()
+        # Same connection as the write transactions: wait for any open one
+        async with self._write_lock:
+            await db.execute("PRAGMA optimize")
+            await db.execute("PRAGMA wal_checkpoint(PASSIVE)")
         logger.info(f"Cleanup completed: {deleted} sessions deleted")
     
     # ==================== TYPICAL DISHES METHODS ====================
     
+    async def _typical_dishes_by_category(self) -> Dict[Optional[str], List[Dict[str, Any]]]:
+        """Load (once) all typical dishes, keyed by category; None holds all"""
+        if self._dishes_cache is None:
+            async with self._dishes_lock:
+                if self._dishes_cache is None:
+                    generation = self._dishes_generation
+                    async with self._reader() as db:
+                        async with db.execute("SELECT * FROM typical_dishes") as cursor:
+                            rows = await cursor.fetchall()
+                    dishes = [dict(row) for row in rows]
+                    cache = {None: dishes}
+                    for dish in dishes:
+                        cache.setdefault(dish['category'], []).append(dish)
+                    # Don't keep a snapshot that an insert made stale mid-load
+                    if generation != self._dishes_generation:
+                        return cache
+                    self._dishes_cache = cache
+        return self._dishes_cache
+    
+    def _invalidate_typical_dishes(self):
+        """Drop the typical dishes cache after a catalogue change"""
+        self._dishes_cache = None
+        self._dishes_generation += 1
+    
     async def get_typical_dishes(self, category: str = None) -> List[Dict[str, Any]]:
-        """Get typical dishes, optionally filtered by category"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            if category:
-                query = "SELECT * FROM typical_dishes WHERE category = ?"
-                params = (category,)
-            else:
-                query = "SELECT * FROM typical_dishes"
-                params = ()
-            
-            async with db.execute(query, params) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        """
+        Get typical dishes, optionally filtered by category
+        
+        Served from the in-memory cache; the returned dicts are shared and
+        must not be modified.
+        """
+        cache = await self._typical_dishes_by_category()
+        return list(cache.get(category, ()))
     
-    async def search_typical_dishes(self, dish_name: str) -> List[Dict[str, Any]]:
-        """Search typical dishes by name"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def search_typical_dishes(self, dish_name: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Search typical dishes by name
+        
+        Every word of dish_name is matched as a prefix against the
+        full-text index, best matches first.
+        """
+        # Quote each word so user input is never parsed as FTS5 syntax
+        terms = " ".join(
+            '"' + word.replace('"', '""') + '"*' for word in dish_name.split()
+        )
+        if not terms:
+            return []
+        
+        async with self._reader() as db:
             async with db.execute("""
-                SELECT * FROM typical_dishes 
-                WHERE dish_name LIKE ?
-                ORDER BY dish_name
-            """, (f"%{dish_name}%",)) as cursor:
+                SELECT td.* FROM typical_dishes_fts
+                JOIN typical_dishes td ON td.id = typical_dishes_fts.rowid
+                WHERE typical_dishes_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (f"dish_name : ({terms})", limit)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
     
     async def add_typical_dish(self, dish_data: Dict[str, Any]) -> int:
         """Add a typical dish to database"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO typical_dishes
-                (dish_name, category, source, calories_per_100g, protein_per_100g,
-                 fat_per_100g, carbs_per_100g, sodium_per_100g, sugar_per_100g,
-                 saturated_fat_per_100g, fiber_per_100g, typical_weight_g,
-                 health_score, description, tags)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                dish_data['dish_name'],
-                dish_data['category'],
-                dish_data.get('source'),
-                dish_data['calories_per_100g'],
-                dish_data['protein_per_100g'],
-                dish_data['fat_per_100g'],
-                dish_data['carbs_per_100g'],
-                dish_data.get('sodium_per_100g'),
-                dish_data.get('sugar_per_100g'),
-                dish_data.get('saturated_fat_per_100g'),
-                dish_data.get('fiber_per_100g'),
-                dish_data.get('typical_weight_g'),
-                dish_data['health_score'],
-                dish_data.get('description'),
-                json.dumps(dish_data.get('tags', []), ensure_ascii=False)
-            ))
-            await db.commit()
-            return cursor.lastrowid
+        async with self._transaction() as db:
+            cursor = await db.execute(_INSERT_TYPICAL_DISH_SQL, _typical_dish_params(dish_data))
+        self._invalidate_typical_dishes()
+        return cursor.lastrowid
+    
+    async def add_typical_dishes(self, dishes: List[Dict[str, Any]]) -> int:
+        """
+        Bulk-insert typical dishes in a single transaction
+        
+        Args:
+            dishes: List of dish dicts in the add_typical_dish format
+        
+        Returns:
+            Number of dishes inserted
+        """
+        params = [_typical_dish_params(dish) for dish in dishes]
+        async with self._transaction() as db:
+            await db.executemany(_INSERT_TYPICAL_DISH_SQL, params)
+        self._invalidate_typical_dishes()
+        return len(params)
     
     async def count_typical_dishes(self) -> int:
         """Count typical dishes in database"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("SELECT COUNT(*) FROM typical_dishes") as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else 0
+        cache = await self._typical_dishes_by_category()
+        return len(cache[None])
 
-    async def get_meal_by_id(self, meal_id: int) -> Optional[Dict[str, Any]]:
-        """Get meal by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM meals WHERE meal_id = ?",
-                (meal_id,)
-            ) as cursor:
+    async def get_meal_by_id(self, meal_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Get meal by ID, optionally only if it belongs to user_id"""
+        if user_id is None:
+            query, params = _SELECT_MEAL_SQL, (meal_id,)
+        else:
+            query, params = _SELECT_USER_MEAL_SQL, (meal_id, user_id)
+        
+        async with self._reader() as db:
+            async with db.execute(query, params) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
     
-    async def update_meal(self, meal_id: int, **kwargs) -> bool:
-        """Update meal fields"""
+    async def meal_exists(self, meal_id: int) -> bool:
+        """Check whether a meal with this ID exists"""
+        async with self._reader() as db:
+            async with db.execute(_MEAL_EXISTS_SQL, (meal_id,)) as cursor:
+                return await cursor.fetchone() is not None
+    
+    async def update_meal(self, meal_id: int, user_id: Optional[int] = None, **kwargs) -> bool:
+        """
+        Update meal fields
+        
+        Args:
+            meal_id: Meal ID
+            user_id: If given, only update the meal when it belongs to this user
+            **kwargs: Columns to update ('components' as a list, encoded here)
+            
+        Returns:
+            True if a meal was updated
+        """
         if not kwargs:
             return False
         
         # Convert dict/list fields to JSON
         if 'components' in kwargs and kwargs['components'] is not None:
-            kwargs['components'] = json.dumps(kwargs['components'], ensure_ascii=False)
+            kwargs['components'] = _dumps(kwargs['components'])
         
-        fields = ", ".join(f"{k} = ?" for k in kwargs.keys())
+        where = "meal_id = ?" if user_id is None else "meal_id = ? AND user_id = ?"
+        query = _update_sql('meals', tuple(kwargs), where)
         values = list(kwargs.values()) + [meal_id]
+        if user_id is not None:
+            values.append(user_id)
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                f"UPDATE meals SET {fields} WHERE meal_id = ?",
-                values
-            )
-            await db.commit()
+        async with self._transaction() as db:
+            cursor = await db.execute(query, values)
+            updated = cursor.rowcount > 0
+        
+        if not updated:
+            logger.warning(f"Meal {meal_id} not found for update")
+            return False
         
         logger.info(f"Meal {meal_id} updated")
         return True
     
-    async def delete_meal(self, meal_id: int) -> bool:
-        """Delete meal by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM meals WHERE meal_id = ?",
-                (meal_id,)
-            )
-            await db.commit()
+    async def delete_meal(self, meal_id: int, user_id: Optional[int] = None) -> bool:
+        """
+        Delete meal by ID
+        
+        Args:
+            meal_id: Meal ID
+            user_id: If given, only delete the meal when it belongs to this user
+            
+        Returns:
+            True if a meal was deleted
+        """
+        if user_id is None:
+            query, params = _DELETE_MEAL_SQL, (meal_id,)
+        else:
+            query, params = _DELETE_USER_MEAL_SQL, (meal_id, user_id)
+        
+        async with self._transaction() as db:
+            cursor = await db.execute(query, params)
             deleted = cursor.rowcount > 0
         
         if deleted:
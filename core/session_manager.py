@@ -1,11 +1,16 @@
 """
 Session manager for tracking active user sessions
 """
-import uuid
+import os
+import copy
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+import orjson
+
+from core.cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,28 +20,35 @@ class SessionManager:
     def __init__(self, database, state_manager):
         self.db = database
         self.state_manager = state_manager
+        # Short-lived session rows, so one user action doesn't refetch the
+        # same session several times; dropped on every write
+        self._session_cache = TTLCache(maxsize=4096, ttl=5)
     
     def generate_session_id(self) -> str:
         """Generate unique session ID"""
-        return f"session_{uuid.uuid4().hex[:16]}"
+        # 64 random bits, same length as the former uuid4().hex[:16]
+        return f"session_{os.urandom(8).hex()}"
     
-    async def create_session(self, user_id: int, photo_file_id: str) -> str:
+    async def create_session(self, user_id: int, photo_file_id: str,
+                             now: Optional[datetime] = None) -> str:
         """Create new meal analysis session"""
         session_id = self.generate_session_id()
+        now = now or datetime.now()
         
         # Create in database
         await self.db.create_session(
             session_id=session_id,
             user_id=user_id,
             photo_file_id=photo_file_id,
-            expires_in_minutes=30
+            expires_in_minutes=30,
+            now=now
         )
         
         # Cache session data
         self.state_manager.set_session_data(user_id, {
             'session_id': session_id,
             'photo_file_id': photo_file_id,
-            'created_at': datetime.now().isoformat(),
+            'created_at': now.isoformat(),
             'corrections_count': 0
         })
         
@@ -45,23 +57,38 @@ class SessionManager:
     
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by ID"""
-        return await self.db.get_session(session_id)
+        session = self._session_cache.get(session_id)
+        if session is None:
+            session = await self.db.get_session(session_id)
+            if session is None:
+                return None
+            self._session_cache[session_id] = session
+        # Callers may set keys on the returned dict; keep the cached one intact
+        return dict(session)
     
     async def get_active_session(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Get active session for user"""
         # Try cache first
         cached = self.state_manager.get_session_data(user_id)
         if cached and 'session_id' in cached:
-            session = await self.db.get_session(cached['session_id'])
+            session = await self.get_session(cached['session_id'])
             if session and session['status'] != 'completed':
                 return session
         
         # Fallback to database
-        return await self.db.get_active_session(user_id)
+        session = await self.db.get_active_session(user_id)
+        if session:
+            self._session_cache[session['session_id']] = session
+            return dict(session)
+        return None
     
     async def update_session(self, session_id: str, **kwargs) -> bool:
         """Update session data"""
-        return await self.db.update_session(session_id, **kwargs)
+        try:
+            return await self.db.update_session(session_id, **kwargs)
+        finally:
+            # Dropped after the write so a read racing it can't re-cache the old row
+            self._session_cache.pop(session_id)
     
     async def save_initial_analysis(self, session_id: str, analysis: Dict[str, Any]) -> bool:
         """Save initial analysis to session"""
@@ -77,49 +104,34 @@ class SessionManager:
         if not session:
             return None
         
-        # Return corrected analysis if exists, otherwise initial
+        # Return corrected analysis if exists, otherwise initial.
+        # Copied because correction parsers edit the analysis in place.
         if session.get('corrected_analysis'):
-            return session['corrected_analysis']
-        return session.get('initial_analysis')
+            return copy.deepcopy(session['corrected_analysis'])
+        return copy.deepcopy(session.get('initial_analysis'))
     
     async def save_correction(self, session_id: str, correction_text: str,
-                             corrected_analysis: Dict[str, Any]) -> bool:
+                             corrected_analysis: Dict[str, Any],
+                             now: Optional[datetime] = None) -> bool:
         """Save correction and updated analysis"""
-        session = await self.get_session(session_id)
-        if not session:
-            return False
-        
-        # Get current corrections (parse JSON if string)
-        corrections = session.get('corrections')
-        if corrections is None:
-            corrections = []
-        elif isinstance(corrections, str):
-            import json
-            try:
-                corrections = json.loads(corrections)
-            except:
-                corrections = []
-        
-        corrections.append({
+        # Only the new entry is encoded; the list is extended in SQL
+        entry = orjson.dumps({
             'text': correction_text,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Update session
-        return await self.update_session(
-            session_id,
-            corrected_analysis=corrected_analysis,
-            corrections=corrections,
-            correction_count=len(corrections)
-        )
+            'timestamp': (now or datetime.now()).isoformat()
+        }).decode()
+        try:
+            return await self.db.append_correction(session_id, entry, corrected_analysis)
+        finally:
+            self._session_cache.pop(session_id)
     
-    async def complete_session(self, session_id: str, final_analysis: Dict[str, Any]) -> bool:
+    async def complete_session(self, session_id: str, final_analysis: Dict[str, Any],
+                               now: Optional[datetime] = None) -> bool:
         """Mark session as completed"""
         return await self.update_session(
             session_id,
             final_analysis=final_analysis,
             status='completed',
-            confirmed_at=datetime.now()
+            confirmed_at=now or datetime.now()
         )
     
     async def cancel_session(self, user_id: int) -> bool:
@@ -4,7 +4,8 @@ State machine for user workflow management
 from enum import Enum
 from typing import Optional, Dict, Any
 import logging
-from expiringdict import ExpiringDict
+
+from core.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
@@ -35,11 +36,20 @@ class UserState(Enum):
     EXPORTING_DATA = "exporting_data"
 
 
+def _sources_by_target(transitions) -> Dict[UserState, tuple]:
+    """Invert a transitions table into target -> sorted source state values"""
+    sources = {state: [] for state in UserState}
+    for from_state, targets in transitions.items():
+        for to_state in targets:
+            sources[to_state].append(from_state.value)
+    return {state: tuple(sorted(values)) for state, values in sources.items()}
+
+
 class StateTransition:
     """Defines valid state transitions"""
     
     TRANSITIONS = {
-        UserState.IDLE: [
+        UserState.IDLE: frozenset({
             UserState.REGISTERING,
             UserState.WAITING_FOR_PHOTO,
             UserState.ANALYZING_PHOTO,
@@ -49,50 +59,61 @@ class StateTransition:
             UserState.DOING_CHECKIN,
             UserState.VIEWING_LESSON,
             UserState.EXPORTING_DATA,
-        ],
-        UserState.REGISTERING: [
+        }),
+        UserState.REGISTERING: frozenset({
             UserState.IDLE,
-        ],
-        UserState.WAITING_FOR_PHOTO: [
+        }),
+        UserState.WAITING_FOR_PHOTO: frozenset({
             UserState.ANALYZING_PHOTO,
             UserState.IDLE,
-        ],
-        UserState.ANALYZING_PHOTO: [
+        }),
+        UserState.ANALYZING_PHOTO: frozenset({
             UserState.WAITING_CONFIRMATION,
             UserState.IDLE,
-        ],
-        UserState.WAITING_CONFIRMATION: [
+        }),
+        UserState.WAITING_CONFIRMATION: frozenset({
             UserState.IDLE,
             UserState.WAITING_CORRECTION,
-        ],
-        UserState.WAITING_CORRECTION: [
+        }),
+        UserState.WAITING_CORRECTION: frozenset({
             UserState.WAITING_CONFIRMATION,
             UserState.IDLE,
-        ],
-        UserState.CONFIGURING_WORKOUT: [
+        }),
+        UserState.CONFIGURING_WORKOUT: frozenset({
             UserState.IDLE,
-        ],
-        UserState.LOGGING_WORKOUT: [
+        }),
+        UserState.LOGGING_WORKOUT: frozenset({
             UserState.IDLE,
-        ],
-        UserState.CREATING_CONTRACT: [
+        }),
+        UserState.CREATING_CONTRACT: frozenset({
             UserState.IDLE,
-        ],
-        UserState.DOING_CHECKIN: [
+        }),
+        UserState.DOING_CHECKIN: frozenset({
             UserState.IDLE,
-        ],
-        UserState.VIEWING_LESSON: [
+        }),
+        UserState.VIEWING_LESSON: frozenset({
             UserState.IDLE,
-        ],
-        UserState.EXPORTING_DATA: [
+        }),
+        UserState.EXPORTING_DATA: frozenset({
             UserState.IDLE,
-        ],
+        }),
     }
     
+    # Every allowed (from, to) pair, for a single hash lookup per check
+    _ALLOWED_PAIRS = frozenset(
+        (from_state, to_state)
+        for from_state, targets in TRANSITIONS.items()
+        for to_state in targets
+    )
+    
+    # Source state values each target can be reached from, for the
+    # conditional UPDATE used when the current state is not cached
+    ALLOWED_FROM = _sources_by_target(TRANSITIONS)
+    
     @classmethod
     def is_valid(cls, from_state: UserState, to_state: UserState) -> bool:
         """Check if transition is valid"""
-        return to_state in cls.TRANSITIONS.get(from_state, [])
+        return (from_state, to_state) in cls._ALLOWED_PAIRS
 
 
 class StateManager:
@@ -101,15 +122,16 @@ class StateManager:
     def __init__(self, database):
         self.db = database
         # In-memory cache with 30 minute expiration
-        self.state_cache: ExpiringDict = ExpiringDict(max_len=10000, max_age_seconds=1800)
+        self.state_cache = TTLCache(maxsize=10000, ttl=1800)
         # Session data cache
-        self.session_cache: ExpiringDict = ExpiringDict(max_len=10000, max_age_seconds=1800)
+        self.session_cache = TTLCache(maxsize=10000, ttl=1800)
     
     async def get_state(self, user_id: int) -> UserState:
         """Get current user state"""
         # Try cache first
-        if user_id in self.state_cache:
-            return self.state_cache[user_id]
+        state = self.state_cache.get(user_id)
+        if state is not None:
+            return state
         
         # Fallback to database
         user = await self.db.get_user(user_id)
@@ -124,7 +146,26 @@ class StateManager:
     async def set_state(self, user_id: int, new_state: UserState, 
                        validate: bool = True) -> bool:
         """Set user state with optional validation"""
-        current_state = await self.get_state(user_id)
+        current_state = self.state_cache.get(user_id)
+        
+        if validate and current_state is None:
+            # Not cached: let the database check the transition while writing
+            if await self.db.transition_user_state(
+                user_id, new_state.value, StateTransition.ALLOWED_FROM[new_state]
+            ):
+                self.state_cache[user_id] = new_state
+                logger.info(f"User {user_id} state: -> {new_state.value}")
+                return True
+            
+            # Nothing updated: either the transition is invalid, or there is
+            # no user row yet and the user is in the default state
+            if await self.db.get_user(user_id) is not None:
+                logger.warning(
+                    f"Invalid state transition for user {user_id}: "
+                    f"-> {new_state.value}"
+                )
+                return False
+            current_state = UserState.IDLE
         
         # Validate transition
         if validate and not StateTransition.is_valid(current_state, new_state):
@@ -140,7 +181,8 @@ class StateManager:
         # Update database
         await self.db.update_user_state(user_id, new_state.value)
         
-        logger.info(f"User {user_id} state: {current_state.value} -> {new_state.value}")
+        previous = current_state.value if current_state is not None else '?'
+        logger.info(f"User {user_id} state: {previous} -> {new_state.value}")
         return True
     
     async def reset_state(self, user_id: int):
@@ -158,8 +200,7 @@ class StateManager:
     
     def clear_session_data(self, user_id: int):
         """Clear session data from cache"""
-        if user_id in self.session_cache:
-            del self.session_cache[user_id]
+        if self.session_cache.pop(user_id, None) is not None:
             logger.debug(f"Session data cleared for user {user_id}")
     
     async def is_in_state(self, user_id: int, *states: UserState) -> bool:
@@ -6,6 +6,56 @@ from typing import Optional, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+_GOAL_TEXT = {
+    'weight_loss': '🎯 Похудение',
+    'muscle_gain': '💪 Набор массы',
+    'maintenance': '⚖️ Поддержание'
+}
+
+_PROFILE_TEMPLATE = """👤 **Профиль**
+
+{goal_text}
+📊 Текущий вес: {current_weight} кг
+🎯 Целевой вес: {target_weight} кг
+📏 Рост: {height} см
+🎂 Возраст: {age} лет
+
+**Дневная норма:**
+🔥 Калории: {daily_calories} ккал
+🥚 Белки: {protein_goal} г
+🥑 Жиры: {fat_goal} г
+🌾 Углеводы: {carbs_goal} г
+
+**Статистика:**
+📅 Дней подряд: {streak_days}
+🍽️ Приёмов пищи: {total_meals_logged}
+💪 Тренировок: {total_workouts}
+"""
+
+_MALE_GENDERS = frozenset({'male', 'm', 'мужской', 'м'})
+
+# Daily calorie delta applied to TDEE: ~0.5kg/week deficit for weight loss,
+# modest surplus for muscle gain, none for maintenance
+_GOAL_CALORIE_ADJUSTMENT = {
+    'weight_loss': -500,
+    'muscle_gain': 300,
+}
+
+# Fallbacks for fields missing from the user row
+_PROFILE_DEFAULTS = {
+    'current_weight': 'не указан',
+    'target_weight': 'не указан',
+    'height': 'не указан',
+    'age': 'не указан',
+    'daily_calories': 0,
+    'protein_goal': 0,
+    'fat_goal': 0,
+    'carbs_goal': 0,
+    'streak_days': 0,
+    'total_meals_logged': 0,
+    'total_workouts': 0,
+}
+
 
 class UserManager:
     """Manages user profiles and settings"""
@@ -43,8 +93,8 @@ class UserManager:
         return await self.db.update_user(user_id, **kwargs)
     
     async def set_goals(self, user_id: int, goal: str, current_weight: float,
-                       target_weight: float, height: int, age: int, gender: str) -> bool:
-        """Set user fitness goals"""
+                       target_weight: float, height: int, age: int, gender: str) -> Dict[str, Any]:
+        """Set user fitness goals and return the saved profile fields"""
         # Calculate daily calorie target
         daily_calories = self._calculate_daily_calories(
             current_weight, height, age, gender, goal
@@ -55,8 +105,7 @@ class UserManager:
         fat_goal = int(daily_calories * 0.25 / 9)  # 25% from fat
         carbs_goal = int((daily_calories - protein_goal * 4 - fat_goal * 9) / 4)
         
-        return await self.db.update_user(
-            user_id,
+        goals = dict(
             goal=goal,
             current_weight=current_weight,
             start_weight=current_weight,
@@ -69,29 +118,18 @@ class UserManager:
             fat_goal=fat_goal,
             carbs_goal=carbs_goal
         )
+        await self.db.update_user(user_id, **goals)
+        return goals
     
     def _calculate_daily_calories(self, weight: float, height: int, 
                                   age: int, gender: str, goal: str) -> int:
         """Calculate daily calorie target using Mifflin-St Jeor equation"""
         # BMR calculation
-        if gender.lower() in ['male', 'm', 'мужской', 'м']:
-            bmr = 10 * weight + 6.25 * height - 5 * age + 5
-        else:
-            bmr = 10 * weight + 6.25 * height - 5 * age - 161
+        bmr_offset = 5 if gender.lower() in _MALE_GENDERS else -161
+        bmr = 10 * weight + 6.25 * height - 5 * age + bmr_offset
         
-        # Activity multiplier (assuming moderate activity)
-        tdee = bmr * 1.55
-        
-        # Adjust for goal
-        if goal == 'weight_loss':
-            # 500 calorie deficit for ~0.5kg per week loss
-            return int(tdee - 500)
-        elif goal == 'muscle_gain':
-            # 300 calorie surplus
-            return int(tdee + 300)
-        else:
-            # Maintenance
-            return int(tdee)
+        # Activity multiplier (assuming moderate activity) plus goal adjustment
+        return int(bmr * 1.55 + _GOAL_CALORIE_ADJUSTMENT.get(goal, 0))
     
     async def get_daily_progress(self, user_id: int) -> Dict[str, Any]:
         """Get user's daily progress"""
@@ -99,34 +137,27 @@ class UserManager:
         if not user:
             return {}
         
-        # Get today's calories
-        consumed_calories = await self.db.get_daily_calories(user_id)
-        
-        # Get today's meals
-        meals = await self.db.get_meals_today(user_id)
-        
-        # Calculate totals
-        total_protein = sum(m['protein_g'] for m in meals)
-        total_fat = sum(m['fat_g'] for m in meals)
-        total_carbs = sum(m['carbs_g'] for m in meals)
+        # Today's calories, macros and meal count in one aggregate query
+        totals = await self.db.get_daily_totals(user_id)
+        consumed_calories = totals['total_calories']
         
         return {
             'consumed_calories': consumed_calories,
             'target_calories': user.get('daily_calories', 0),
             'remaining_calories': user.get('daily_calories', 0) - consumed_calories,
             'protein': {
-                'consumed': total_protein,
+                'consumed': totals['protein_g'],
                 'target': user.get('protein_goal', 0)
             },
             'fat': {
-                'consumed': total_fat,
+                'consumed': totals['fat_g'],
                 'target': user.get('fat_goal', 0)
             },
             'carbs': {
-                'consumed': total_carbs,
+                'consumed': totals['carbs_g'],
                 'target': user.get('carbs_goal', 0)
             },
-            'meals_count': len(meals)
+            'meals_count': totals['meals_count']
         }
     
     async def update_weight(self, user_id: int, new_weight: float) -> bool:
@@ -139,29 +170,9 @@ class UserManager:
         if not user:
             return None
         
-        goal_text = {
-            'weight_loss': '🎯 Похудение',
-            'muscle_gain': '💪 Набор массы',
-            'maintenance': '⚖️ Поддержание'
-        }.get(user.get('goal'), 'Не указана')
-        
-        summary = f"""👤 **Профиль**
-
-{goal_text}
-📊 Текущий вес: {user.get('current_weight', 'не указан')} кг
-🎯 Целевой вес: {user.get('target_weight', 'не указан')} кг
-📏 Рост: {user.get('height', 'не указан')} см
-🎂 Возраст: {user.get('age', 'не указан')} лет
-
-**Дневная норма:**
-🔥 Калории: {user.get('daily_calories', 0)} ккал
-🥚 Белки: {user.get('protein_goal', 0)} г
-🥑 Жиры: {user.get('fat_goal', 0)} г
-🌾 Углеводы: {user.get('carbs_goal', 0)} г
-
-**Статистика:**
-📅 Дней подряд: {user.get('streak_days', 0)}
-🍽️ Приёмов пищи: {user.get('total_meals_logged', 0)}
-💪 Тренировок: {user.get('total_workouts', 0)}
-"""
-        return summary
+        context = {
+            **_PROFILE_DEFAULTS,
+            **user,
+            'goal_text': _GOAL_TEXT.get(user.get('goal'), 'Не указана'),
+        }
+        return _PROFILE_TEMPLATE.format_map(context)
@@ -1,16 +1,17 @@
 """
 Обработчики команд и сообщений Telegram бота
 """
+import asyncio
 import logging
-import hashlib
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from io import BytesIO
+from typing import Dict, Any, Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 from api_client import OpenRouterClient
+from core.cache import TTLCache
 from config import (
     WELCOME_MESSAGE,
     HELP_MESSAGE,
@@ -24,88 +25,146 @@ from config import (
 
 logger = logging.getLogger(__name__)
 
-# Кэш для хранения результатов анализа
-analysis_cache: Dict[str, Dict[str, Any]] = {}
+# Кэш для хранения результатов анализа: LRU с ограничением размера и TTL
+ANALYSIS_CACHE_MAX_SIZE = 1024
+analysis_cache = TTLCache(maxsize=ANALYSIS_CACHE_MAX_SIZE, ttl=CACHE_TIMEOUT_SECONDS)
 
 # Инициализация клиента API
 api_client = OpenRouterClient()
 
+# Анализы, выполняющиеся прямо сейчас: параллельные запросы с тем же ключом
+# ждут уже запущенный анализ вместо повторного вызова API
+_inflight: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+
 
 def get_cache_key(file_unique_id: str) -> str:
-    """Генерирует ключ кэша для файла"""
-    return hashlib.md5(file_unique_id.encode()).hexdigest()
+    """Генерирует ключ кэша для файла (file_unique_id уже уникален, хэш не нужен)"""
+    return f"img:{file_unique_id}"
 
 
 def get_from_cache(cache_key: str) -> Any:
     """Получает результат из кэша, если он не устарел"""
-    if cache_key in analysis_cache:
-        cached_data = analysis_cache[cache_key]
-        if datetime.now() - cached_data['timestamp'] < timedelta(seconds=CACHE_TIMEOUT_SECONDS):
-            logger.info(f"Результат найден в кэше: {cache_key}")
-            return cached_data['result']
-        else:
-            # Удаляем устаревший кэш
-            del analysis_cache[cache_key]
-    return None
+    result = analysis_cache.get(cache_key)
+    if result is not None:
+        logger.info(f"Результат найден в кэше: {cache_key}")
+    return result
 
 
 def save_to_cache(cache_key: str, result: Dict[str, Any]):
-    """Сохраняет результат в кэш"""
-    analysis_cache[cache_key] = {
-        'result': result,
-        'timestamp': datetime.now()
-    }
+    """Сохраняет результат в кэш, вытесняя самые старые записи при переполнении"""
+    analysis_cache[cache_key] = result
     logger.info(f"Результат сохранен в кэш: {cache_key}")
 
 
-def format_analysis_message(data: Dict[str, Any]) -> str:
+async def _download_and_analyze(context: ContextTypes.DEFAULT_TYPE, file_id: str) -> Optional[Dict[str, Any]]:
+    """Скачивает фото и анализирует его через API"""
+    file = await context.bot.get_file(file_id)
+    buffer = BytesIO()
+    await file.download_to_memory(buffer)
+    # getvalue() отдает внутренний буфер без лишнего копирования
+    image_bytes = buffer.getvalue()
+    
+    logger.info(f"Фото скачано: {len(image_bytes)} байт")
+    
+    return await api_client.analyze_food_image(image_bytes)
+
+
+async def analyze_photo_once(cache_key: str, context: ContextTypes.DEFAULT_TYPE,
+                             file_id: str) -> Optional[Dict[str, Any]]:
     """
-    Форматирует результаты анализа в красивое сообщение
+    Анализирует фото, объединяя параллельные запросы с одним ключом кэша
     
     Args:
-        data: Словарь с результатами анализа
+        cache_key: Ключ кэша фото
+        context: Контекст обработчика
+        file_id: ID файла в Telegram
         
     Returns:
-        Отформатированное сообщение
+        Результат анализа или None, если фото не удалось проанализировать
     """
-    message = f"""🍽️ *Название:* {data['dish_name']}
+    pending = _inflight.get(cache_key)
+    if pending is not None:
+        logger.info(f"Ожидаем уже запущенный анализ: {cache_key}")
+        # shield: отмена одного ожидающего не должна отменять общий анализ
+        return await asyncio.shield(pending)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[cache_key] = future
+    try:
+        result = await _download_and_analyze(context, file_id)
+        if result is not None:
+            save_to_cache(cache_key, result)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        # Помечаем исключение как полученное, даже если никто не ждал
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            future.cancel()
+        _inflight.pop(cache_key, None)
+
 
-⚖️ *Общий вес:* {data['weight_grams']} г
+# Постоянные части сообщения с результатами анализа (подставляются через format_map)
+_HEADER_TEMPLATE = """🍽️ *Название:* {dish_name}
 
-🔥 *Калорийность:* {data['calories_total']} ккал ({data['calories_per_100g']:.0f} ккал/100г)
+⚖️ *Общий вес:* {weight_grams} г
+
+🔥 *Калорийность:* {calories_total} ккал ({calories_per_100g:.0f} ккал/100г)
 
 *Состав БЖУ:*
-🥚 Белки: {data['protein_g']} г
-🥑 Жиры: {data['fat_g']} г
-🌾 Углеводы: {data['carbs_g']} г
+🥚 Белки: {protein_g} г
+🥑 Жиры: {fat_g} г
+🌾 Углеводы: {carbs_g} г
+
+⭐ *Полезность:* {health_score}/10"""
 
-⭐ *Полезность:* {data['health_score']}/10"""
+_ANALYSIS_TEMPLATE = "\n\n📋 *Анализ:*\n{detailed_analysis}"
+
+_FOOTER_TEMPLATE = (
+    "\n\n💡 *Рекомендации для похудения:*\n{recommendations}"
+    "\n\n📏 *Совет по порции:*\n{portion_advice}"
+)
+
+
+def format_analysis_message(data: Dict[str, Any]) -> str:
+    """
+    Форматирует результаты анализа в красивое сообщение
+    
+    Args:
+        data: Словарь с результатами анализа
+        
+    Returns:
+        Отформатированное сообщение
+    """
+    parts = [_HEADER_TEMPLATE.format_map(data)]
 
     # Добавляем детализацию по компонентам, если есть
-    if 'components' in data and data['components']:
-        message += "\n\n📊 *Детализация:*"
-        for comp in data['components']:
-            comp_name = comp.get('name', 'Неизвестно')
-            comp_weight = comp.get('weight_grams', 0)
-            comp_calories = comp.get('calories', 0)
-            message += f"\n• {comp_name}: {comp_weight}г, {comp_calories} ккал"
+    components = data.get('components')
+    if components:
+        parts.append("\n\n📊 *Детализация:*\n")
+        parts.append("\n".join(
+            f"• {comp.get('name', 'Неизвестно')}: "
+            f"{comp.get('weight_grams', 0)}г, {comp.get('calories', 0)} ккал"
+            for comp in components
+        ))
     
     # Добавляем анализ
-    message += f"\n\n📋 *Анализ:*\n{data['detailed_analysis']}"
+    parts.append(_ANALYSIS_TEMPLATE.format_map(data))
     
     # Добавляем предупреждения, если есть
-    if 'warnings' in data and data['warnings']:
-        message += "\n\n⚠️ *Предупреждения:*"
-        for warning in data['warnings']:
-            message += f"\n{warning}"
+    warnings = data.get('warnings')
+    if warnings:
+        parts.append("\n\n⚠️ *Предупреждения:*\n")
+        parts.append("\n".join(map(str, warnings)))
     
-    # Добавляем рекомендации
-    message += f"\n\n💡 *Рекомендации для похудения:*\n{data['recommendations']}"
+    # Добавляем рекомендации и совет по порции
+    parts.append(_FOOTER_TEMPLATE.format_map(data))
     
-    # Добавляем совет по порции
-    message += f"\n\n📏 *Совет по порции:*\n{data['portion_advice']}"
-    
-    return message
+    # Собираем сообщение за одно выделение памяти
+    return "".join(parts)
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -154,23 +213,14 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.info(f"Отправлен кэшированный результат пользователю {user_id}")
             return
         
-        # Скачиваем фото
-        file = await context.bot.get_file(photo.file_id)
-        image_bytes = await file.download_as_bytearray()
-        
-        logger.info(f"Фото скачано: {len(image_bytes)} байт")
-        
-        # Анализируем фото через API
-        result = await api_client.analyze_food_image(bytes(image_bytes))
+        # Скачиваем и анализируем фото (результат сохраняется в кэш)
+        result = await analyze_photo_once(cache_key, context, photo.file_id)
         
         if result is None:
             await status_message.edit_text(ERROR_POOR_QUALITY)
             logger.warning(f"Не удалось проанализировать фото от пользователя {user_id}")
             return
         
-        # Сохраняем в кэш
-        save_to_cache(cache_key, result)
-        
         # Форматируем и отправляем результат
         formatted_message = format_analysis_message(result)
         await status_message.edit_text(
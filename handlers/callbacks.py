@@ -29,18 +29,9 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     action, value = parse_callback_data(callback_data)
     
     # Route to appropriate handler
-    if action == "goal":
-        await handle_goal_callback(update, context, value)
-    elif action == "gender":
-        await handle_gender_callback(update, context, value)
-    elif action == "confirm":
-        await handle_confirm_callback(update, context, value)
-    elif action == "cancel":
-        await handle_cancel_callback(update, context, value)
-    elif action == "meal":
-        await handle_meal_type_callback(update, context, value)
-    elif action == "edit":
-        await handle_edit_callback(update, context, value)
+    handler = _CALLBACK_HANDLERS.get(action)
+    if handler:
+        await handler(update, context, value)
     else:
         logger.warning(f"Unknown callback action: {action}")
         await query.edit_message_text(
@@ -99,7 +90,7 @@ async def handle_gender_callback(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Save all data to database
-    await user_manager.set_goals(
+    user = await user_manager.set_goals(
         user_id=user_id,
         goal=setup_data['goal'],
         current_weight=setup_data['current_weight'],
@@ -109,9 +100,6 @@ async def handle_gender_callback(update: Update, context: ContextTypes.DEFAULT_T
         gender=gender
     )
     
-    # Get updated user data
-    user = await user_manager.db.get_user(user_id)
-    
     # Send completion message
     gender_names = {'male': '👨 Мужской', 'female': '👩 Женский'}
     
@@ -237,3 +225,14 @@ async def handle_edit_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             f"✏️ Редактирование: {item}",
             parse_mode=ParseMode.MARKDOWN
         )
+
+
+# Callback action -> handler, used by handle_callback_query
+_CALLBACK_HANDLERS = {
+    'goal': handle_goal_callback,
+    'gender': handle_gender_callback,
+    'confirm': handle_confirm_callback,
+    'cancel': handle_cancel_callback,
+    'meal': handle_meal_type_callback,
+    'edit': handle_edit_callback,
+}
@@ -163,7 +163,7 @@ async def meals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Get meal history
-    meals = await db.get_meals_history(user_id, limit=10)
+    meals = await db.get_meals_history_summary(user_id, limit=10)
     
     # Format and send
     message = format_meals_history(meals)
@@ -73,6 +73,9 @@ async def confirm_and_save_meal(
                 await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
             return False
         
+        # One timestamp for the meal, the session and today's stats
+        now = datetime.now()
+        
         # Get user data for goals
         user = await user_manager.db.get_user(user_id)
         
@@ -92,7 +95,7 @@ async def confirm_and_save_meal(
             'health_score': final_analysis.get('health_score', 5),
             'confidence_avg': _calculate_avg_confidence(final_analysis),
             'corrections_count': session.get('correction_count', 0),
-            'eaten_at': datetime.now()
+            'eaten_at': now
         }
         
         # Save meal to database
@@ -103,17 +106,14 @@ async def confirm_and_save_meal(
         
         logger.info(f"Meal saved: {meal_id} for user {user_id}")
         
-        # Update daily statistics
-        await _update_daily_stats(db, user_id, meal_data)
-        
         # Complete session
-        await session_manager.complete_session(session_id, final_analysis)
+        await session_manager.complete_session(session_id, final_analysis, now=now)
         
         # Reset state
         await state_manager.set_state(user_id, UserState.IDLE, validate=False)
         
         # Get updated daily stats
-        daily_stats = await db.get_daily_stats(user_id, datetime.now().date())
+        daily_stats = await db.get_daily_stats(user_id, now.date())
         
         # Format success message
         message = format_meal_saved(meal_data, user, daily_stats)
@@ -160,39 +160,6 @@ def _calculate_avg_confidence(analysis: Dict[str, Any]) -> float:
     return sum(confidences) / len(confidences)
 
 
-async def _update_daily_stats(db, user_id: int, meal_data: Dict[str, Any]):
-    """Update daily statistics with new meal"""
-    today = datetime.now().date()
-    
-    # Get existing stats
-    stats = await db.get_daily_stats(user_id, today)
-    
-    if stats:
-        # Update existing stats
-        await db.update_daily_stats(
-            user_id=user_id,
-            date=today,
-            calories_consumed=stats['calories_consumed'] + meal_data['total_calories'],
-            protein_consumed=stats['protein_consumed'] + meal_data['protein_g'],
-            fat_consumed=stats['fat_consumed'] + meal_data['fat_g'],
-            carbs_consumed=stats['carbs_consumed'] + meal_data['carbs_g'],
-            meals_count=stats['meals_count'] + 1
-        )
-    else:
-        # Create new stats
-        await db.create_daily_stats(
-            user_id=user_id,
-            date=today,
-            calories_consumed=meal_data['total_calories'],
-            protein_consumed=meal_data['protein_g'],
-            fat_consumed=meal_data['fat_g'],
-            carbs_consumed=meal_data['carbs_g'],
-            meals_count=1
-        )
-    
-    logger.info(f"Daily stats updated for user {user_id}")
-
-
 async def _check_goals_and_get_message(user: Dict[str, Any], daily_stats: Dict[str, Any]) -> str:
     """
     Check if user achieved goals and return motivational message
@@ -14,7 +14,10 @@ async def main():
     logger.info("Initializing database...")
     
     db = Database("data/database.db")
-    await db.initialize()
+    try:
+        await db.initialize()
+    finally:
+        await db.close()
     
     logger.info("✅ Database initialized successfully!")
     logger.info("Database location: data/database.db")
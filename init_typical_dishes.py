@@ -370,40 +370,42 @@ TYPICAL_DISHES = [
 async def init_dishes():
     """Initialize typical dishes in database"""
     db = Database(config.DATABASE_PATH)
-    await db.initialize()
-    
-    # Check if already populated
-    count = await db.count_typical_dishes()
-    if count > 0:
-        logger.info(f"Database already has {count} dishes")
-        response = input("Do you want to add more dishes? (y/n): ")
-        if response.lower() != 'y':
-            return
-    
-    # Add dishes
-    logger.info(f"Adding {len(TYPICAL_DISHES)} typical dishes...")
-    
-    for dish in TYPICAL_DISHES:
+    try:
+        await db.initialize()
+        
+        # Check if already populated
+        count = await db.count_typical_dishes()
+        if count > 0:
+            logger.info(f"Database already has {count} dishes")
+            response = input("Do you want to add more dishes? (y/n): ")
+            if response.lower() != 'y':
+                return
+        
+        # Add dishes
+        logger.info(f"Adding {len(TYPICAL_DISHES)} typical dishes...")
+        
         try:
-            dish_id = await db.add_typical_dish(dish)
-            logger.info(f"✅ Added: {dish['dish_name']} (ID: {dish_id}, Score: {dish['health_score']}/10)")
+            added = await db.add_typical_dishes(TYPICAL_DISHES)
+            logger.info(f"✅ Added {added} dishes")
         except Exception as e:
-            logger.error(f"❌ Failed to add {dish['dish_name']}: {e}")
-    
-    # Show summary
-    total = await db.count_typical_dishes()
-    logger.info(f"\n✅ Total dishes in database: {total}")
-    
-    # Show by category
-    categories = {}
-    all_dishes = await db.get_typical_dishes()
-    for dish in all_dishes:
-        cat = dish['category']
-        categories[cat] = categories.get(cat, 0) + 1
-    
-    logger.info("\n📊 Dishes by category:")
-    for cat, count in categories.items():
-        logger.info(f"  {cat}: {count}")
+            logger.error(f"❌ Failed to add dishes: {e}")
+        
+        # Show summary
+        total = await db.count_typical_dishes()
+        logger.info(f"\n✅ Total dishes in database: {total}")
+        
+        # Show by category
+        categories = {}
+        all_dishes = await db.get_typical_dishes()
+        for dish in all_dishes:
+            cat = dish['category']
+            categories[cat] = categories.get(cat, 0) + 1
+        
+        logger.info("\n📊 Dishes by category:")
+        for cat, count in categories.items():
+            logger.info(f"  {cat}: {count}")
+    finally:
+        await db.close()
 
 
 if __name__ == '__main__':
@@ -17,7 +17,8 @@ from handlers import (
     help_command,
     handle_photo,
     handle_text,
-    error_handler
+    error_handler,
+    api_client
 )
 
 # Настройка логирования
@@ -33,13 +34,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def on_shutdown(application: Application):
+    """Закрывает общие HTTP-соединения при остановке бота"""
+    await api_client.close()
+
+
 def main():
     """Главная функция запуска бота"""
     logger.info("Запуск бота...")
     
     try:
         # Создаем приложение
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .post_shutdown(on_shutdown)
+            .build()
+        )
         
         # Регистрируем обработчики команд
         application.add_handler(CommandHandler("start", start_command))
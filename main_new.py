@@ -50,6 +50,8 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+CLEANUP_INTERVAL_SECONDS = 15 * 60
+
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Route text messages based on user state"""
@@ -87,6 +89,16 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+async def periodic_cleanup(db: Database):
+    """Purge expired sessions and run PRAGMA optimize every 15 minutes"""
+    while True:
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+        try:
+            await db.cleanup()
+        except Exception as e:
+            logger.error(f"Periodic cleanup failed: {e}")
+
+
 async def post_init(application: Application):
     """Initialize bot components after application start"""
     logger.info("Initializing bot components...")
@@ -105,6 +117,7 @@ async def post_init(application: Application):
     application.bot_data['state_manager'] = state_manager
     application.bot_data['session_manager'] = session_manager
     application.bot_data['user_manager'] = user_manager
+    application.bot_data['cleanup_task'] = asyncio.create_task(periodic_cleanup(db))
     
     logger.info("✅ Bot components initialized")
 
@@ -113,9 +126,14 @@ async def cleanup(application: Application):
     """Cleanup on shutdown"""
     logger.info("Cleaning up...")
     
+    cleanup_task = application.bot_data.get('cleanup_task')
+    if cleanup_task:
+        cleanup_task.cancel()
+    
     db = application.bot_data.get('database')
     if db:
         await db.cleanup()
+        await db.close()
     
     logger.info("✅ Cleanup completed")
 
@@ -92,134 +92,137 @@ async def test_burger_comparison():
     
     # Initialize database
     db = Database(config.DATABASE_PATH)
-    await db.initialize()
-    
-    # Check if we have typical dishes
-    count = await db.count_typical_dishes()
-    logger.info(f"\n📊 Блюд в базе данных: {count}")
-    
-    if count == 0:
-        logger.error("❌ База данных пуста! Запусти init_typical_dishes.py")
-        return
-    
-    # Initialize comparator
-    comparator = DishComparator(db)
-    
-    # Test 1: Find similar dishes
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 1: Поиск похожих блюд")
-    logger.info("=" * 60)
-    
-    similar_dishes = await comparator.find_similar_dishes(BURGER_ANALYSIS, limit=3)
-    
-    logger.info(f"\nНайдено похожих блюд: {len(similar_dishes)}")
-    
-    for i, dish in enumerate(similar_dishes, 1):
-        logger.info(f"\n{i}. {dish['dish_name']}")
-        logger.info(f"   Категория: {dish['category']}")
-        logger.info(f"   Источник: {dish.get('source', 'N/A')}")
-        logger.info(f"   Health Score: {dish['health_score']}/10")
-        logger.info(f"   Сходство: {dish['similarity']['total_score'] * 100:.1f}%")
-        logger.info(f"   - По названию: {dish['similarity']['name_score'] * 100:.1f}%")
-        logger.info(f"   - По питательности: {dish['similarity']['nutrition_score'] * 100:.1f}%")
-        logger.info(f"   - По компонентам: {dish['similarity']['component_score'] * 100:.1f}%")
-    
-    # Test 2: Calculate realism score
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 2: Оценка реалистичности")
-    logger.info("=" * 60)
-    
-    comparison_result = await comparator.calculate_realism_score(
-        BURGER_ANALYSIS,
-        similar_dishes
-    )
-    
-    logger.info(f"\nРеалистичность: {comparison_result['realism_score']}")
-    logger.info(f"\nОтклонения от типичного блюда:")
-    
-    for dev in comparison_result['deviations']:
-        metric = dev['metric']
-        user_val = dev['user']
-        typical_val = dev['typical']
-        diff = dev['diff_percent']
+    try:
+        await db.initialize()
         
-        logger.info(f"  {metric}: {user_val} vs {typical_val} ({diff:+.1f}%)")
-    
-    if comparison_result['warnings']:
-        logger.info(f"\nПредупреждения:")
-        for warning in comparison_result['warnings']:
-            logger.info(f"  ⚠️ {warning}")
-    
-    # Test 3: Adjust health score
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 3: Корректировка health score")
-    logger.info("=" * 60)
-    
-    original_score = BURGER_ANALYSIS['health_score']
-    adjusted_score, explanation = await comparator.adjust_health_score(
-        BURGER_ANALYSIS,
-        similar_dishes
-    )
-    
-    logger.info(f"\nОригинальная оценка: {original_score}/10")
-    logger.info(f"Скорректированная оценка: {adjusted_score}/10")
-    logger.info(f"Объяснение: {explanation}")
-    
-    # Test 4: Detect category
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 4: Определение категории")
-    logger.info("=" * 60)
-    
-    category = comparator.detect_dish_category(BURGER_ANALYSIS)
-    logger.info(f"\nОпределённая категория: {category}")
-    
-    # Test 5: Context score
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 5: Оценка контекста")
-    logger.info("=" * 60)
-    
-    context_score = comparator.calculate_dish_context_score(BURGER_ANALYSIS['components'])
-    logger.info(f"\nКонтекстная оценка: {context_score} (0-1, выше = здоровее)")
-    
-    # Test 6: Format comparison message
-    logger.info("\n" + "=" * 60)
-    logger.info("ТЕСТ 6: Форматирование сообщения")
-    logger.info("=" * 60)
-    
-    # Update analysis with adjusted score
-    BURGER_ANALYSIS['health_score'] = adjusted_score
-    BURGER_ANALYSIS['health_score_original'] = original_score
-    BURGER_ANALYSIS['comparison'] = comparison_result
-    
-    formatted_message = format_dish_comparison(BURGER_ANALYSIS, comparison_result)
-    
-    logger.info("\nФорматированное сообщение для пользователя:")
-    logger.info("-" * 60)
-    print(formatted_message)
-    logger.info("-" * 60)
-    
-    # Summary
-    logger.info("\n" + "=" * 60)
-    logger.info("ИТОГИ ТЕСТА")
-    logger.info("=" * 60)
-    
-    logger.info(f"\n✅ Найдено похожих блюд: {len(similar_dishes)}")
-    logger.info(f"✅ Ближайшее совпадение: {similar_dishes[0]['dish_name']}")
-    logger.info(f"✅ Health score: {original_score}/10 → {adjusted_score}/10")
-    logger.info(f"✅ Категория: {category}")
-    logger.info(f"✅ Реалистичность: {comparison_result['realism_score']}")
-    
-    # Check if goal achieved
-    if adjusted_score <= 5:
-        logger.info("\n🎯 ЦЕЛЬ ДОСТИГНУТА!")
-        logger.info(f"   Бургер получил оценку {adjusted_score}/10 (не 7/10)")
-        logger.info("   Система корректно определила, что это фастфуд")
-    else:
-        logger.warning("\n⚠️ ЦЕЛЬ НЕ ДОСТИГНУТА")
-        logger.warning(f"   Бургер всё ещё имеет оценку {adjusted_score}/10")
-        logger.warning("   Нужна дополнительная настройка алгоритма")
-    
-    logger.info("\n" + "=" * 60)
+        # Check if we have typical dishes
+        count = await db.count_typical_dishes()
+        logger.info(f"\n📊 Блюд в базе данных: {count}")
+        
+        if count == 0:
+            logger.error("❌ База данных пуста! Запусти init_typical_dishes.py")
+            return
+        
+        # Initialize comparator
+        comparator = DishComparator(db)
+        
+        # Test 1: Find similar dishes
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 1: Поиск похожих блюд")
+        logger.info("=" * 60)
+        
+        similar_dishes = await comparator.find_similar_dishes(BURGER_ANALYSIS, limit=3)
+        
+        logger.info(f"\nНайдено похожих блюд: {len(similar_dishes)}")
+        
+        for i, dish in enumerate(similar_dishes, 1):
+            logger.info(f"\n{i}. {dish['dish_name']}")
+            logger.info(f"   Категория: {dish['category']}")
+            logger.info(f"   Источник: {dish.get('source', 'N/A')}")
+            logger.info(f"   Health Score: {dish['health_score']}/10")
+            logger.info(f"   Сходство: {dish['similarity']['total_score'] * 100:.1f}%")
+            logger.info(f"   - По названию: {dish['similarity']['name_score'] * 100:.1f}%")
+            logger.info(f"   - По питательности: {dish['similarity']['nutrition_score'] * 100:.1f}%")
+            logger.info(f"   - По компонентам: {dish['similarity']['component_score'] * 100:.1f}%")
+        
+        # Test 2: Calculate realism score
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 2: Оценка реалистичности")
+        logger.info("=" * 60)
+        
+        comparison_result = await comparator.calculate_realism_score(
+            BURGER_ANALYSIS,
+            similar_dishes
+        )
+        
+        logger.info(f"\nРеалистичность: {comparison_result['realism_score']}")
+        logger.info(f"\nОтклонения от типичного блюда:")
+        
+        for dev in comparison_result['deviations']:
+            metric = dev['metric']
+            user_val = dev['user']
+            typical_val = dev['typical']
+            diff = dev['diff_percent']
+        
+            logger.info(f"  {metric}: {user_val} vs {typical_val} ({diff:+.1f}%)")
+        
+        if comparison_result['warnings']:
+            logger.info(f"\nПредупреждения:")
+            for warning in comparison_result['warnings']:
+                logger.info(f"  ⚠️ {warning}")
+        
+        # Test 3: Adjust health score
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 3: Корректировка health score")
+        logger.info("=" * 60)
+        
+        original_score = BURGER_ANALYSIS['health_score']
+        adjusted_score, explanation = await comparator.adjust_health_score(
+            BURGER_ANALYSIS,
+            similar_dishes
+        )
+        
+        logger.info(f"\nОригинальная оценка: {original_score}/10")
+        logger.info(f"Скорректированная оценка: {adjusted_score}/10")
+        logger.info(f"Объяснение: {explanation}")
+        
+        # Test 4: Detect category
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 4: Определение категории")
+        logger.info("=" * 60)
+        
+        category = comparator.detect_dish_category(BURGER_ANALYSIS)
+        logger.info(f"\nОпределённая категория: {category}")
+        
+        # Test 5: Context score
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 5: Оценка контекста")
+        logger.info("=" * 60)
+        
+        context_score = comparator.calculate_dish_context_score(BURGER_ANALYSIS['components'])
+        logger.info(f"\nКонтекстная оценка: {context_score} (0-1, выше = здоровее)")
+        
+        # Test 6: Format comparison message
+        logger.info("\n" + "=" * 60)
+        logger.info("ТЕСТ 6: Форматирование сообщения")
+        logger.info("=" * 60)
+        
+        # Update analysis with adjusted score
+        BURGER_ANALYSIS['health_score'] = adjusted_score
+        BURGER_ANALYSIS['health_score_original'] = original_score
+        BURGER_ANALYSIS['comparison'] = comparison_result
+        
+        formatted_message = format_dish_comparison(BURGER_ANALYSIS, comparison_result)
+        
+        logger.info("\nФорматированное сообщение для пользователя:")
+        logger.info("-" * 60)
+        print(formatted_message)
+        logger.info("-" * 60)
+        
+        # Summary
+        logger.info("\n" + "=" * 60)
+        logger.info("ИТОГИ ТЕСТА")
+        logger.info("=" * 60)
+        
+        logger.info(f"\n✅ Найдено похожих блюд: {len(similar_dishes)}")
+        logger.info(f"✅ Ближайшее совпадение: {similar_dishes[0]['dish_name']}")
+        logger.info(f"✅ Health score: {original_score}/10 → {adjusted_score}/10")
+        logger.info(f"✅ Категория: {category}")
+        logger.info(f"✅ Реалистичность: {comparison_result['realism_score']}")
+        
+        # Check if goal achieved
+        if adjusted_score <= 5:
+            logger.info("\n🎯 ЦЕЛЬ ДОСТИГНУТА!")
+            logger.info(f"   Бургер получил оценку {adjusted_score}/10 (не 7/10)")
+            logger.info("   Система корректно определила, что это фастфуд")
+        else:
+            logger.warning("\n⚠️ ЦЕЛЬ НЕ ДОСТИГНУТА")
+            logger.warning(f"   Бургер всё ещё имеет оценку {adjusted_score}/10")
+            logger.warning("   Нужна дополнительная настройка алгоритма")
+        
+        logger.info("\n" + "=" * 60)
+    finally:
+        await db.close()
 
 
 if __name__ == '__main__':
@@ -58,56 +58,59 @@ async def test_edge_cases():
     print("\n3. Testing Database Edge Cases...")
     
     db = Database("data/database.db")
-    await db.initialize()
-    
-    # Non-existent user
-    user = await db.get_user(999999999)
-    print(f"   Non-existent user: {'✅' if user is None else '❌'}")
-    
-    # Non-existent session
-    from core.session_manager import SessionManager
-    state_manager = StateManager(db)
-    session_manager = SessionManager(db, state_manager)
-    
-    session = await session_manager.get_session("invalid_session_id")
-    print(f"   Non-existent session: {'✅' if session is None else '❌'}")
-    
-    # Test 4: State transitions
-    print("\n4. Testing Invalid State Transitions...")
-    
-    test_user = 777777
-    
-    # Try invalid transition
-    await state_manager.set_state(test_user, UserState.IDLE, validate=False)
-    current = await state_manager.get_state(test_user)
-    print(f"   Initial state: {current}")
-    
-    # Try to go from IDLE to WAITING_CONFIRMATION (invalid)
     try:
-        await state_manager.set_state(test_user, UserState.WAITING_CONFIRMATION)
-        print(f"   Invalid transition: ❌ Should have failed")
-    except:
-        print(f"   Invalid transition blocked: ✅")
-    
-    # Test 5: Extreme values
-    print("\n5. Testing Extreme Values...")
-    
-    # Very high calories
-    extreme_analysis = {
-        'components': [{'name': 'Test', 'weight_g': 10000, 'calories': 50000}],
-        'weight_grams': 10000,
-        'calories_total': 50000,
-        'protein_g': 1000,
-        'fat_g': 1000,
-        'carbs_g': 1000
-    }
-    
-    from utils.validators import FoodAnalysisValidator
-    food_validator = FoodAnalysisValidator()
-    valid, error = food_validator.validate_analysis(extreme_analysis)
-    print(f"   Extreme calories: {'❌' if not valid else '✅'} {error if error else 'OK'}")
-    
-    await db.cleanup()
+        await db.initialize()
+        
+        # Non-existent user
+        user = await db.get_user(999999999)
+        print(f"   Non-existent user: {'✅' if user is None else '❌'}")
+        
+        # Non-existent session
+        from core.session_manager import SessionManager
+        state_manager = StateManager(db)
+        session_manager = SessionManager(db, state_manager)
+        
+        session = await session_manager.get_session("invalid_session_id")
+        print(f"   Non-existent session: {'✅' if session is None else '❌'}")
+        
+        # Test 4: State transitions
+        print("\n4. Testing Invalid State Transitions...")
+        
+        test_user = 777777
+        
+        # Try invalid transition
+        await state_manager.set_state(test_user, UserState.IDLE, validate=False)
+        current = await state_manager.get_state(test_user)
+        print(f"   Initial state: {current}")
+        
+        # Try to go from IDLE to WAITING_CONFIRMATION (invalid)
+        try:
+            await state_manager.set_state(test_user, UserState.WAITING_CONFIRMATION)
+            print(f"   Invalid transition: ❌ Should have failed")
+        except:
+            print(f"   Invalid transition blocked: ✅")
+        
+        # Test 5: Extreme values
+        print("\n5. Testing Extreme Values...")
+        
+        # Very high calories
+        extreme_analysis = {
+            'components': [{'name': 'Test', 'weight_g': 10000, 'calories': 50000}],
+            'weight_grams': 10000,
+            'calories_total': 50000,
+            'protein_g': 1000,
+            'fat_g': 1000,
+            'carbs_g': 1000
+        }
+        
+        from utils.validators import FoodAnalysisValidator
+        food_validator = FoodAnalysisValidator()
+        valid, error = food_validator.validate_analysis(extreme_analysis)
+        print(f"   Extreme calories: {'❌' if not valid else '✅'} {error if error else 'OK'}")
+        
+        await db.cleanup()
+    finally:
+        await db.close()
     
     print("\n" + "=" * 60)
     print("✅ EDGE CASES TESTING COMPLETED")
@@ -0,0 +1,67 @@
+"""
+Unit tests for the TTL cache
+"""
+import pytest
+from core.cache import TTLCache
+
+
+class FakeTimer:
+    """Manually advanced clock"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    """Test entries disappear once their TTL passes"""
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=30, timer=timer)
+    cache["a"] = 1
+    
+    timer.now = 29
+    assert cache.get("a") == 1
+    timer.now = 30
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_evicted():
+    """Test the least recently used entry is evicted when full"""
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache["a"] = 1
+    cache["b"] = 2
+    cache.get("a")
+    cache["c"] = 3
+    
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_pop():
+    """Test pop removes and returns the value"""
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache["a"] = 1
+    
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    assert cache.get("a", "missing") == "missing"
+
+
+def test_contains_ignores_expired_entries():
+    """Test membership only reports live entries"""
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=30, timer=timer)
+    cache["a"] = 1
+    
+    assert "a" in cache
+    assert "b" not in cache
+    timer.now = 30
+    assert "a" not in cache
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
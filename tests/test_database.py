@@ -4,9 +4,13 @@ Unit tests for database module
 import pytest
 import pytest_asyncio
 import asyncio
+import json
+import aiosqlite
 import os
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from core.database import Database
+from core import database as database_module
+from core.database import Database, MealRow
 
 
 @pytest_asyncio.fixture
@@ -24,6 +28,7 @@ async def db():
     yield database
     
     # Cleanup
+    await database.close()
     if os.path.exists(test_db_path):
         os.remove(test_db_path)
 
@@ -156,11 +161,98 @@ async def test_get_meals_today(db):
     
     await db.create_meal(123456, "session_1", 500, 20, 15, 60)
     await db.create_meal(123456, "session_1", 700, 30, 25, 80)
+    meal_id = await db.create_meal(123456, "session_1", 300, 10, 5, 40)
+    await db.update_meal(meal_id, eaten_at=datetime.now() - timedelta(days=1))
     
     meals = await db.get_meals_today(123456)
     assert len(meals) == 2
 
 
+@pytest.mark.asyncio
+async def test_get_meals_by_date(db):
+    """Test getting meals for a specific day"""
+    await db.create_user(123456, "testuser")
+    
+    meal_data = {
+        'user_id': 123456,
+        'session_id': None,
+        'dish_name': "Test",
+        'meal_type': "lunch",
+        'photo_file_id': None,
+        'components': [],
+        'total_weight': 300,
+        'total_calories': 500,
+        'protein_g': 20,
+        'fat_g': 15,
+        'carbs_g': 60,
+        'health_score': 7,
+        'confidence_avg': 0.8,
+        'corrections_count': 0
+    }
+    await db.save_meal({**meal_data, 'eaten_at': datetime(2024, 5, 1, 12, 30)})
+    await db.save_meal({**meal_data, 'eaten_at': datetime(2024, 5, 1, 23, 59)})
+    await db.save_meal({**meal_data, 'eaten_at': datetime(2024, 5, 2, 0, 0)})
+    
+    meals = await db.get_meals_by_date(123456, date(2024, 5, 1))
+    assert len(meals) == 2
+    
+    meals = await db.get_meals_by_date(123456, datetime(2024, 5, 2))
+    assert len(meals) == 1
+    
+    meals = await db.get_meals_by_date(123456, date(2024, 4, 30))
+    assert meals == []
+
+
+@pytest.mark.asyncio
+async def test_get_meals_by_date_ordered_by_meal_type(db):
+    """Test meals are ordered breakfast, lunch, dinner, snack"""
+    await db.create_user(123456, "testuser")
+    
+    meal_data = {
+        'user_id': 123456,
+        'session_id': None,
+        'dish_name': "Test",
+        'photo_file_id': None,
+        'components': [],
+        'total_weight': 300,
+        'total_calories': 500,
+        'protein_g': 20,
+        'fat_g': 15,
+        'carbs_g': 60,
+        'health_score': 7,
+        'confidence_avg': 0.8,
+        'corrections_count': 0
+    }
+    await db.save_meal({**meal_data, 'meal_type': "snack", 'eaten_at': datetime(2024, 5, 1, 8, 0)})
+    await db.save_meal({**meal_data, 'meal_type': "dinner", 'eaten_at': datetime(2024, 5, 1, 19, 0)})
+    await db.save_meal({**meal_data, 'meal_type': "breakfast", 'eaten_at': datetime(2024, 5, 1, 9, 0)})
+    await db.save_meal({**meal_data, 'meal_type': "lunch", 'eaten_at': datetime(2024, 5, 1, 13, 0)})
+    
+    meals = await db.get_meals_by_date(123456, date(2024, 5, 1))
+    assert [m['meal_type'] for m in meals] == ["breakfast", "lunch", "dinner", "snack"]
+
+
+@pytest.mark.asyncio
+async def test_get_daily_totals(db):
+    """Test daily nutrition totals aggregation"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    
+    totals = await db.get_daily_totals(123456)
+    assert totals['meals_count'] == 0
+    assert totals['total_calories'] == 0
+    
+    await db.create_meal(123456, "session_1", 500, 20, 15, 60)
+    await db.create_meal(123456, "session_1", 700, 30, 25, 80)
+    
+    totals = await db.get_daily_totals(123456)
+    assert totals['meals_count'] == 2
+    assert totals['total_calories'] == 1200
+    assert totals['protein_g'] == 50
+    assert totals['fat_g'] == 40
+    assert totals['carbs_g'] == 140
+
+
 @pytest.mark.asyncio
 async def test_get_daily_calories(db):
     """Test daily calorie calculation"""
@@ -174,5 +266,336 @@ async def test_get_daily_calories(db):
     assert total == 1200
 
 
+@pytest.mark.asyncio
+async def test_delete_meal_scoped_to_user(db):
+    """Test deleting a meal only succeeds for its owner"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    meal_id = await db.create_meal(123456, "session_1", 500, 20, 15, 60)
+    
+    assert await db.delete_meal(meal_id, user_id=999) is False
+    assert await db.meal_exists(meal_id)
+    
+    assert await db.delete_meal(meal_id, user_id=123456) is True
+    assert not await db.meal_exists(meal_id)
+
+
+@pytest.mark.asyncio
+async def test_connection_uses_wal(db):
+    """Test shared connection runs in WAL mode"""
+    conn = await db._connection()
+    async with conn.execute("PRAGMA journal_mode") as cursor:
+        row = await cursor.fetchone()
+    assert row[0] == "wal"
+    await db.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_reader_pool_is_read_only(db):
+    """Test pooled readers see committed writes but cannot write"""
+    await db.create_user(123456, "testuser")
+    assert (await db.get_user(123456))["username"] == "testuser"
+    
+    async with db._reader() as conn:
+        async with conn.execute("PRAGMA mmap_size") as cursor:
+            assert (await cursor.fetchone())[0] > 0
+        with pytest.raises(aiosqlite.OperationalError):
+            await conn.execute("DELETE FROM users")
+
+
+@pytest.mark.asyncio
+async def test_create_meal_increments_meals_logged(db):
+    """Test logging meals bumps the user's meal counter"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    await db.create_meal(123456, "session_1", 500, 20, 15, 60)
+    await db.create_meal(123456, "session_1", 300, 10, 5, 40)
+    
+    user = await db.get_user(123456)
+    assert user["total_meals_logged"] == 2
+
+
+@pytest.mark.asyncio
+async def test_add_typical_dishes_bulk(db):
+    """Test bulk insert of typical dishes"""
+    dishes = [
+        {
+            'dish_name': f'Dish {i}',
+            'category': 'test',
+            'calories_per_100g': 100 + i,
+            'protein_per_100g': 10,
+            'fat_per_100g': 5,
+            'carbs_per_100g': 12,
+            'health_score': 6,
+            'tags': ['test']
+        }
+        for i in range(3)
+    ]
+    
+    assert await db.add_typical_dishes(dishes) == 3
+    assert await db.count_typical_dishes() == 3
+    assert len(await db.get_typical_dishes('test')) == 3
+
+
+@pytest.mark.asyncio
+async def test_daily_stats_follow_meal_writes(db):
+    """Test daily_stats rollup tracks meal insert, update and delete"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    
+    first = await db.create_meal(123456, "session_1", 500, 20, 15, 60)
+    second = await db.create_meal(123456, "session_1", 700, 30, 25, 80)
+    stats = await db.get_daily_stats(123456, date.today())
+    assert stats['calories_consumed'] == 1200
+    assert stats['protein_consumed'] == 50
+    assert stats['meals_count'] == 2
+    
+    await db.update_meal(first, total_calories=400)
+    await db.delete_meal(second)
+    stats = await db.get_daily_stats(123456, date.today())
+    assert stats['calories_consumed'] == 400
+    assert stats['protein_consumed'] == 20
+    assert stats['meals_count'] == 1
+    assert await db.get_daily_calories(123456) == 400
+
+
+@pytest.mark.asyncio
+async def test_update_daily_stats_upserts(db):
+    """Test update_daily_stats creates the row once and then updates it"""
+    await db.create_user(123456, "testuser")
+    today = date.today()
+    
+    assert await db.update_daily_stats(123456, today) is False
+    assert await db.update_daily_stats(123456, today, water_ml=250)
+    assert await db.update_daily_stats(123456, today, steps=4000)
+    
+    stats = await db.get_daily_stats(123456, today)
+    assert stats['water_ml'] == 250
+    assert stats['steps'] == 4000
+    assert stats['calories_consumed'] == 0
+
+
+@pytest.mark.asyncio
+async def test_update_user_rejects_unknown_column(db):
+    """Test update_user refuses columns outside the users whitelist"""
+    await db.create_user(123456, "testuser")
+    
+    with pytest.raises(ValueError):
+        await db.update_user(123456, **{"goal = 'x', user_id": 1})
+
+
+@pytest.mark.asyncio
+async def test_search_typical_dishes(db):
+    """Test full-text dish search by name prefix"""
+    base = {
+        'category': 'test',
+        'calories_per_100g': 100,
+        'protein_per_100g': 10,
+        'fat_per_100g': 5,
+        'carbs_per_100g': 12,
+        'health_score': 6,
+        'description': 'Борщ не содержит',
+    }
+    await db.add_typical_dishes([
+        {**base, 'dish_name': 'Борщ красный'},
+        {**base, 'dish_name': 'Гречка с курицей'},
+        {**base, 'dish_name': 'Салат "Цезарь"'},
+    ])
+    
+    assert [d['dish_name'] for d in await db.search_typical_dishes('борщ')] == ['Борщ красный']
+    assert [d['dish_name'] for d in await db.search_typical_dishes('Греч кур')] == ['Гречка с курицей']
+    assert [d['dish_name'] for d in await db.search_typical_dishes('"цезарь')] == ['Салат "Цезарь"']
+    assert await db.search_typical_dishes('   ') == []
+
+
+@pytest.mark.asyncio
+async def test_meal_components_view(db):
+    """Test v_meal_components expands meals.components into rows"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    await db.save_meal({
+        'user_id': 123456,
+        'session_id': "session_1",
+        'dish_name': "Гречка с курицей",
+        'meal_type': "lunch",
+        'photo_file_id': "photo_1",
+        'components': [
+            {'name': "Гречка", 'weight_g': 150, 'calories': 165, 'protein_g': 6,
+             'fat_g': 2, 'carbs_g': 30, 'confidence': 0.9},
+            {'name': "Курица", 'weight_g': 120, 'calories': 200, 'protein_g': 30,
+             'fat_g': 8, 'carbs_g': 0, 'confidence': 0.8},
+        ],
+        'total_weight': 270,
+        'total_calories': 365,
+        'protein_g': 36,
+        'fat_g': 10,
+        'carbs_g': 30,
+        'health_score': 8,
+        'confidence_avg': 0.85,
+        'corrections_count': 0,
+        'eaten_at': datetime.now()
+    })
+    
+    conn = await db._connection()
+    async with conn.execute(
+        "SELECT name, weight_g, calories FROM v_meal_components WHERE user_id = ? ORDER BY name",
+        (123456,)
+    ) as cursor:
+        rows = [tuple(row) for row in await cursor.fetchall()]
+    assert rows == [("Гречка", 150, 165), ("Курица", 120, 200)]
+
+
+@pytest.mark.asyncio
+async def test_delete_expired_sessions_in_batches(db, monkeypatch):
+    """Test expired sessions are purged across several batches"""
+    monkeypatch.setattr(database_module, "EXPIRED_SESSIONS_BATCH", 2)
+    await db.create_user(123456, "testuser")
+    for i in range(5):
+        await db.create_session(f"expired_{i}", 123456, "photo", expires_in_minutes=-1)
+    await db.create_session("active", 123456, "photo")
+    
+    assert await db.delete_expired_sessions() == 5
+    assert await db.get_session("active") is not None
+    assert await db.get_session("expired_0") is None
+
+
+@pytest.mark.asyncio
+async def test_get_meals_history_summary(db):
+    """Test history summary returns only listing columns"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    await db.create_meal(123456, "session_1", 500, 20, 15, 60, meal_type="lunch")
+    
+    meals = await db.get_meals_history_summary(123456)
+    assert len(meals) == 1
+    assert meals[0]['total_calories'] == 500
+    assert meals[0]['meal_type'] == "lunch"
+    assert 'components' not in meals[0]
+
+
+@pytest.mark.asyncio
+async def test_typical_dishes_cache_invalidated_on_insert(db):
+    """Test cached dish catalogue picks up newly added dishes"""
+    dish = {
+        'dish_name': 'Омлет',
+        'category': 'breakfast',
+        'calories_per_100g': 150,
+        'protein_per_100g': 10,
+        'fat_per_100g': 11,
+        'carbs_per_100g': 2,
+        'health_score': 7
+    }
+    assert await db.count_typical_dishes() == 0
+    
+    await db.add_typical_dish(dish)
+    assert await db.count_typical_dishes() == 1
+    assert [d['dish_name'] for d in await db.get_typical_dishes('breakfast')] == ['Омлет']
+    assert await db.get_typical_dishes('lunch') == []
+
+
+@pytest.mark.asyncio
+async def test_get_meals_history_returns_meal_rows(db):
+    """Test meal history comes back as MealRow tuples, newest first"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    first = await db.create_meal(123456, "session_1", 500, 20, 15, 60)
+    await db.update_meal(first, eaten_at=datetime.now() - timedelta(hours=1))
+    second = await db.create_meal(123456, "session_1", 700, 30, 25, 80)
+    
+    meals = await db.get_meals_history(123456)
+    assert all(isinstance(meal, MealRow) for meal in meals)
+    assert [meal.meal_id for meal in meals] == [second, first]
+    assert meals[0]._asdict()['total_calories'] == 700
+
+
+@pytest.mark.asyncio
+async def test_append_correction(db):
+    """Test corrections are appended in place with a matching count"""
+    await db.create_user(123456, "testuser")
+    await db.create_session("session_1", 123456, "photo_1")
+    
+    assert await db.append_correction("session_1", '{"text": "меньше риса"}', {'calories_total': 400})
+    assert await db.append_correction("session_1", '{"text": "без соуса"}', {'calories_total': 350})
+    assert not await db.append_correction("missing", '{"text": "x"}', {})
+    
+    session = await db.get_session("session_1")
+    assert json.loads(session['corrections']) == [{"text": "меньше риса"}, {"text": "без соуса"}]
+    assert session['correction_count'] == 2
+    assert session['corrected_analysis'] == {'calories_total': 350}
+
+
+@pytest.mark.asyncio
+async def test_cleanup_waits_for_open_write(db, monkeypatch):
+    """Test cleanup PRAGMAs don't run inside another caller's transaction"""
+    async def no_expired_sessions():
+        return 0
+    monkeypatch.setattr(db, "delete_expired_sessions", no_expired_sessions)
+    
+    async with db._transaction() as conn:
+        await conn.execute("INSERT INTO users (user_id, username) VALUES (?, ?)", (123456, "testuser"))
+        cleanup = asyncio.create_task(db.cleanup())
+        await asyncio.sleep(0.05)
+        assert not cleanup.done()
+    
+    await asyncio.wait_for(cleanup, timeout=5)
+    assert await db.get_user(123456) is not None
+
+
+@pytest.mark.asyncio
+async def test_daily_stats_backfilled_from_existing_meals(db):
+    """Test the one-time migration seeds daily_stats from older meals"""
+    await db.create_user(123456, "testuser")
+    
+    # Simulate a database from before the rollup triggers existed
+    async with db._transaction() as conn:
+        await conn.execute("DROP TRIGGER trg_meals_daily_stats_insert")
+        await conn.executemany(
+            "INSERT INTO meals (user_id, total_calories, protein_g, fat_g, carbs_g, eaten_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (123456, 500, 20, 15, 60, datetime(2024, 5, 1, 9)),
+                (123456, 700, 30, 25, 80, datetime(2024, 5, 1, 19)),
+                (123456, 300, 10, 5, 40, datetime(2024, 5, 2, 13)),
+            ]
+        )
+        await conn.execute("PRAGMA user_version = 0")
+    
+    await db.initialize()
+    await db.initialize()
+    
+    assert (await db.get_daily_totals(123456, date(2024, 5, 1))) == {
+        'meals_count': 2,
+        'total_calories': 1200,
+        'protein_g': 50,
+        'fat_g': 40,
+        'carbs_g': 140
+    }
+    stats = await db.get_daily_stats(123456, date(2024, 5, 2))
+    assert stats['calories_consumed'] == 300
+    assert stats['meals_count'] == 1
+
+
+@pytest.mark.asyncio
+async def test_fts_rebuilt_once_for_existing_dishes(db):
+    """Test dishes added before the FTS index are indexed by a one-time rebuild"""
+    # Simulate a catalogue filled before typical_dishes_fts existed
+    async with db._transaction() as conn:
+        await conn.execute("DROP TRIGGER trg_typical_dishes_fts_insert")
+        await conn.execute(
+            "INSERT INTO typical_dishes (dish_name, category, calories_per_100g, "
+            "protein_per_100g, fat_per_100g, carbs_per_100g) VALUES (?, ?, ?, ?, ?, ?)",
+            ('Борщ красный', 'soup', 50, 3, 2, 6)
+        )
+        await conn.execute("PRAGMA user_version = 1")
+    assert await db.search_typical_dishes('борщ') == []
+    
+    await db.initialize()
+    assert [d['dish_name'] for d in await db.search_typical_dishes('борщ')] == ['Борщ красный']
+    
+    conn = await db._connection()
+    async with conn.execute("PRAGMA user_version") as cursor:
+        assert (await cursor.fetchone())[0] == len(database_module._MIGRATIONS)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -3,9 +3,11 @@ Unit tests for state machine
 """
 import pytest
 import pytest_asyncio
+import asyncio
 import os
 from core.database import Database
 from core.state_machine import StateManager, UserState, StateTransition
+from core.session_manager import SessionManager
 
 
 @pytest_asyncio.fixture
@@ -24,6 +26,7 @@ async def setup():
     
     yield db, state_manager
     
+    await db.close()
     if os.path.exists(test_db_path):
         os.remove(test_db_path)
 
@@ -147,5 +150,82 @@ def test_state_transitions():
     assert not StateTransition.is_valid(UserState.WAITING_CONFIRMATION, UserState.ANALYZING_PHOTO)
 
 
+@pytest.mark.asyncio
+async def test_session_reads_cached_until_write(setup):
+    """Test session rows are reused between writes and refreshed after"""
+    db, state_manager = setup
+    session_manager = SessionManager(db, state_manager)
+    
+    session_id = await session_manager.create_session(123456, "photo_1")
+    first = await session_manager.get_session(session_id)
+    first['status'] = 'tampered'
+    assert (await session_manager.get_session(session_id))['status'] == 'pending'
+    
+    await session_manager.save_initial_analysis(session_id, {'components': []})
+    session = await session_manager.get_session(session_id)
+    assert session['initial_analysis'] == {'components': []}
+    
+    analysis = await session_manager.get_current_analysis(session_id)
+    analysis['components'].append({'name': 'rice'})
+    assert (await session_manager.get_current_analysis(session_id))['components'] == []
+
+
+@pytest.mark.asyncio
+async def test_session_read_during_write_not_cached_stale(setup, monkeypatch):
+    """Test a read racing a session write doesn't keep the old row cached"""
+    db, state_manager = setup
+    session_manager = SessionManager(db, state_manager)
+    session_id = await session_manager.create_session(123456, "photo_1")
+    
+    write_started = asyncio.Event()
+    release_write = asyncio.Event()
+    update_session = db.update_session
+    
+    async def slow_update_session(session_id, **kwargs):
+        write_started.set()
+        await release_write.wait()
+        return await update_session(session_id, **kwargs)
+    monkeypatch.setattr(db, "update_session", slow_update_session)
+    
+    write = asyncio.create_task(session_manager.complete_session(session_id, {'components': []}))
+    await write_started.wait()
+    assert (await session_manager.get_session(session_id))['status'] == 'pending'
+    release_write.set()
+    assert await write is True
+    
+    assert (await session_manager.get_session(session_id))['status'] == 'completed'
+    assert await session_manager.get_active_session(123456) is None
+
+
+@pytest.mark.asyncio
+async def test_uncached_transition_checked_by_database(setup):
+    """Test transitions validated in SQL when the state is not cached"""
+    db, state_manager = setup
+    
+    await state_manager.set_state(123456, UserState.ANALYZING_PHOTO, validate=False)
+    
+    # Fresh manager has an empty cache
+    new_state_manager = StateManager(db)
+    assert await new_state_manager.set_state(123456, UserState.REGISTERING) is False
+    assert (await db.get_user(123456))['current_state'] == 'analyzing_photo'
+    
+    new_state_manager = StateManager(db)
+    assert await new_state_manager.set_state(123456, UserState.WAITING_CONFIRMATION) is True
+    assert (await db.get_user(123456))['current_state'] == 'waiting_confirmation'
+    assert await new_state_manager.get_state(123456) == UserState.WAITING_CONFIRMATION
+
+
+@pytest.mark.asyncio
+async def test_first_time_user_transition(setup):
+    """Test a user without a row yet transitions from the default IDLE state"""
+    db, state_manager = setup
+    
+    assert await state_manager.set_state(999, UserState.REGISTERING) is True
+    assert await state_manager.get_state(999) == UserState.REGISTERING
+    
+    assert await StateManager(db).set_state(999, UserState.ANALYZING_PHOTO) is True
+    assert await StateManager(db).set_state(999, UserState.WAITING_CORRECTION) is False
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])